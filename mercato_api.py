@@ -0,0 +1,197 @@
+"""
+Mercato HTTP API
+Async backend for mercato-ui: stock scores, the S&P 500 leaderboard and
+saved portfolios, served from one process with a shared score cache
+
+Run with:
+    uvicorn mercato_api:app --host 0.0.0.0 --port 8000
+"""
+
+import asyncio
+import re
+import threading
+from datetime import date
+
+import uvicorn
+from fastapi import FastAPI, HTTPException, Query, Response
+from fastapi.middleware.cors import CORSMiddleware
+from pydantic import BaseModel, Field
+
+from mercato_data import TTLCache, prefetch_stock_data
+from mercato_fetch import get_fetcher
+from mercato_leaderboard import get_leaderboard
+from mercato_metrics import render_prometheus
+from mercato_scoring import score_stocks
+from mercato_store import PortfolioStore
+
+SCORE_TTL = 5 * 60
+TICKER_PATTERN = re.compile(r'^[A-Z0-9^][A-Z0-9.\-=]{0,14}$')
+
+app = FastAPI(title="Mercato")
+app.add_middleware(
+    CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'],
+    expose_headers=['X-As-Of', 'X-Unscored']
+)
+
+# Scored stocks are shared by every request in the process
+_score_cache = TTLCache(SCORE_TTL, name='scores')
+_portfolio_store = None
+_portfolio_store_lock = threading.Lock()
+
+
+class Position(BaseModel):
+    shares: float = Field(gt=0)
+
+
+def get_portfolio_store():
+    global _portfolio_store
+    with _portfolio_store_lock:
+        if _portfolio_store is None:
+            _portfolio_store = PortfolioStore()
+        return _portfolio_store
+
+
+def normalize_ticker(ticker):
+    ticker = ticker.strip().upper()
+    if not TICKER_PATTERN.match(ticker):
+        raise HTTPException(status_code=400, detail=f"Invalid ticker: {ticker}")
+    return ticker
+
+
+def stock_record(score):
+    """A score_stock result as JSON, with the field names mercato-ui reads
+
+    The *_score fields are the 0-20 sub-scores rescaled to 0-100 for the
+    detail page, and risk_score is the inverse of stability. peer_score is
+    None until the leaderboard job has built percentile tables.
+    """
+    return {
+        'ticker': score['ticker'],
+        'name': score['company_name'],
+        'logo_url': score['logo_url'],
+        'sector': score['sector'],
+        'current_price': round(float(score['price']), 2),
+        'price_change_pct': round(float(score['price_change']), 2),
+        'financial_health': float(score['financial_health']),
+        'profitability': float(score['profitability']),
+        'growth': float(score['growth']),
+        'momentum': float(score['momentum']),
+        'stability': float(score['stability']),
+        'final_score': float(score['final_score']),
+        'financial_score': round(float(score['financial_health']) * 5, 1),
+        'profitability_score': round(float(score['profitability']) * 5, 1),
+        'growth_score': round(float(score['growth']) * 5, 1),
+        'momentum_score': round(float(score['momentum']) * 5, 1),
+        'stability_score': round(float(score['stability']) * 5, 1),
+        'risk_score': round(100 - float(score['stability']) * 5, 1),
+        'peer_score': float(score['peer_score']) if 'peer_score' in score else None,
+        'score_date': date.today().isoformat()
+    }
+
+
+def score_tickers(tickers):
+    """Scored records for tickers, computing only those not already cached
+
+    Misses are fetched and scored together in one batch. Tickers without
+    data map to None.
+    """
+    records = {ticker: _score_cache.get(ticker) for ticker in tickers}
+    missing = [ticker for ticker, record in records.items() if record is None]
+    if missing:
+        records.update(score_uncached(missing))
+    return records
+
+
+def score_uncached(tickers):
+    """Fetch and score tickers in one batch, caching each record"""
+    scored = {s['ticker']: stock_record(s) for s in score_stocks(prefetch_stock_data(tickers))}
+    for record in scored.values():
+        _score_cache.set(record['ticker'], record)
+    return {ticker: scored.get(ticker) for ticker in tickers}
+
+
+def score_ticker(ticker):
+    """One ticker's scored record; concurrent requests for it share a single fetch"""
+    return _score_cache.get_or_load(ticker, lambda: score_uncached([ticker])[ticker])
+
+
+def portfolio_records(user_id):
+    """(scored holdings with their shares, tickers held that couldn't be scored)
+
+    Unscored holdings are kept out of the records, so every record's scores
+    are numbers mercato-ui can average.
+    """
+    holdings = get_portfolio_store().holdings(user_id)
+    records = score_tickers(list(holdings))
+    portfolio, unscored = [], []
+    for ticker, shares in holdings.items():
+        if records[ticker] is None:
+            unscored.append(ticker)
+            continue
+        portfolio.append({**records[ticker], 'shares': shares})
+    return portfolio, unscored
+
+
+@app.get('/leaderboard')
+async def leaderboard(response: Response, limit: int = Query(500, ge=1, le=1000), sector: str = None):
+    board = await asyncio.to_thread(get_leaderboard, limit, sector)
+    if board is None:
+        raise HTTPException(status_code=503, detail="Leaderboard not built yet, run mercato_leaderboard.py")
+    response.headers['X-As-Of'] = board['as_of']
+    return board['stocks']
+
+
+@app.get('/stock/{ticker}')
+async def get_stock(ticker: str):
+    ticker = normalize_ticker(ticker)
+    record = await asyncio.to_thread(score_ticker, ticker)
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"Stock not available: {ticker}")
+    return record
+
+
+@app.get('/portfolio/{user_id}')
+async def get_portfolio(user_id: str, response: Response):
+    portfolio, unscored = await asyncio.to_thread(portfolio_records, user_id)
+    response.headers['X-Unscored'] = ','.join(unscored)
+    return portfolio
+
+
+@app.post('/portfolio/{user_id}/{ticker}', status_code=201)
+async def add_to_portfolio(user_id: str, ticker: str, position: Position):
+    ticker = normalize_ticker(ticker)
+    record = await asyncio.to_thread(score_ticker, ticker)
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"Stock not available: {ticker}")
+    added = await asyncio.to_thread(get_portfolio_store().add, user_id, ticker, position.shares)
+    if not added:
+        raise HTTPException(status_code=409, detail=f"{ticker} already in portfolio")
+    return {**record, 'shares': position.shares}
+
+
+@app.put('/portfolio/{user_id}/{ticker}')
+async def update_portfolio(user_id: str, ticker: str, position: Position):
+    ticker = normalize_ticker(ticker)
+    updated = await asyncio.to_thread(get_portfolio_store().update, user_id, ticker, position.shares)
+    if not updated:
+        raise HTTPException(status_code=404, detail=f"{ticker} not in portfolio")
+    return {'ticker': ticker, 'shares': position.shares}
+
+
+@app.delete('/portfolio/{user_id}/{ticker}')
+async def remove_from_portfolio(user_id: str, ticker: str):
+    ticker = normalize_ticker(ticker)
+    removed = await asyncio.to_thread(get_portfolio_store().remove, user_id, ticker)
+    if not removed:
+        raise HTTPException(status_code=404, detail=f"{ticker} not in portfolio")
+    return {'ticker': ticker, 'removed': True}
+
+
+@app.get('/metrics')
+async def metrics():
+    """Stage latencies, cache and provider counters as Prometheus text"""
+    return Response(render_prometheus(get_fetcher().stats.snapshot()), media_type='text/plain; version=0.0.4')
+
+
+if __name__ == "__main__":
+    uvicorn.run(app, host='0.0.0.0', port=8000)
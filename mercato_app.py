@@ -4,12 +4,21 @@ Light blue design with Mercato logo
 """
 
 import streamlit as st
-import yfinance as yf
-import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 from datetime import datetime
 import base64
+import math
+import os
+import time
+
+from mercato_data import get_chart_history, get_quotes, invalidate_fundamentals, iter_stock_data
+from mercato_fetch import get_fetcher
+from mercato_history import score_history
+from mercato_metrics import get_metrics, render_prometheus, summarize, timed
+from mercato_portfolio import HIGH_CORRELATION, RiskModel, analyze_portfolio
+from mercato_scoring import calculate_portfolio_score, generate_insights, rescore_stocks
+from mercato_symbols import get_symbol_directory, is_valid_symbol
 
 # Load logo as base64
 try:
@@ -17,7 +26,30 @@ try:
         LOGO_BASE64 = base64.b64encode(f.read()).decode()
 except:
     # Fallback SVG if logo file not found
-    LOGO_BASE64 = None, timedelta
+    LOGO_BASE64 = None
+
+# Tickers still loading after this many seconds are marked on the dashboard
+SCORE_TIMEOUT = 30
+# Minimum seconds between dashboard redraws while scores stream in
+REDRAW_INTERVAL = 0.5
+# Portfolios with more holdings than this are listed as a paged table instead of cards
+CARD_LIMIT = 25
+TABLE_PAGE_SIZE = 50
+
+SUBSCORES = [
+    ('Financial', 'financial_health'),
+    ('Profit', 'profitability'),
+    ('Growth', 'growth'),
+    ('Momentum', 'momentum'),
+    ('Stability', 'stability')
+]
+# Stock table sort options, as (score key, highest first)
+TABLE_SORTS = {
+    'Score': ('final_score', True),
+    'Ticker': ('ticker', False),
+    'Daily change': ('price_change', True),
+    **{label: (key, True) for label, key in SUBSCORES}
+}
 
 # Page config
 st.set_page_config(
@@ -295,6 +327,52 @@ st.markdown("""
         transition: width 0.8s ease;
     }
     
+    /* Stock table - one navy block for large portfolios */
+    .stock-table {
+        width: 100%;
+        border-collapse: collapse;
+        background: #343967;
+        border-radius: 14px;
+        overflow: hidden;
+        box-shadow: 0 6px 18px rgba(0, 0, 0, 0.12);
+    }
+    
+    .stock-table th {
+        color: #c9a961;
+        font-size: 12px;
+        font-weight: 600;
+        text-transform: uppercase;
+        letter-spacing: 0.8px;
+        text-align: left;
+        padding: 12px 14px;
+        border-bottom: 1px solid rgba(230, 224, 213, 0.15);
+    }
+    
+    .stock-table td {
+        color: #e6e0d5;
+        padding: 10px 14px;
+        border-bottom: 1px solid rgba(230, 224, 213, 0.08);
+        vertical-align: middle;
+    }
+    
+    .stock-table .company-logo {
+        width: 28px;
+        height: 28px;
+        padding: 4px;
+        margin-right: 10px;
+        vertical-align: middle;
+    }
+    
+    .stock-table .subscore-bar {
+        width: 56px;
+    }
+    
+    .table-score {
+        font-size: 24px;
+        font-weight: 300;
+        text-align: right;
+    }
+    
     /* Buttons - Navy with gold hover */
     .stButton > button {
         background: linear-gradient(135deg, #343967 0%, #2a2f52 100%);
@@ -426,348 +504,33 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 
-# ============ SCORING FUNCTIONS (Same as before) ============
-
-def get_stock_data(ticker):
-    """Get financial data for a stock"""
-    try:
-        stock = yf.Ticker(ticker)
-        info = stock.info
-        hist = stock.history(period="1y")
-        
-        if hist.empty:
-            return None
-        
-        company_name = info.get('longName', info.get('shortName', ticker))
-        logo_url = f"https://logo.clearbit.com/{info.get('website', '').replace('https://', '').replace('http://', '').split('/')[0]}"
-        
-        return {
-            'ticker': ticker,
-            'company_name': company_name,
-            'logo_url': logo_url,
-            'sector': info.get('sector', 'Unknown'),
-            'price': hist['Close'].iloc[-1],
-            'prev_close': hist['Close'].iloc[-2] if len(hist) >= 2 else hist['Close'].iloc[-1],
-            'total_debt': info.get('totalDebt', 0),
-            'total_cash': info.get('totalCash', 0),
-            'free_cash_flow': info.get('freeCashflow', 0),
-            'market_cap': info.get('marketCap', 1),
-            'profit_margin': info.get('profitMargins', 0),
-            'operating_margin': info.get('operatingMargins', 0),
-            'roe': info.get('returnOnEquity', 0),
-            'revenue_growth': info.get('revenueGrowth', 0),
-            'earnings_growth': info.get('earningsGrowth', 0),
-            'beta': info.get('beta', 1),
-            'fifty_two_week_high': info.get('fiftyTwoWeekHigh', 0),
-            'fifty_two_week_low': info.get('fiftyTwoWeekLow', 0),
-            'hist': hist
-        }
-    except Exception as e:
-        st.error(f"Error fetching {ticker}: {e}")
-        return None
-
-
-def calculate_financial_health(data):
-    scores = []
-    debt_ratio = data['total_debt'] / data['market_cap'] if data['market_cap'] > 0 else 1
-    if debt_ratio < 0.2:
-        debt_score = 1.0
-    elif debt_ratio < 0.5:
-        debt_score = 0.85
-    elif debt_ratio < 0.8:
-        debt_score = 0.65
-    else:
-        debt_score = 0.4
-    scores.append(debt_score)
-    
-    cash_ratio = data['total_cash'] / data['market_cap'] if data['market_cap'] > 0 else 0
-    cash_score = min(1.0, cash_ratio * 5 + 0.3)
-    scores.append(cash_score)
-    
-    fcf_ratio = data['free_cash_flow'] / data['market_cap'] if data['market_cap'] > 0 else 0
-    if fcf_ratio > 0.05:
-        fcf_score = 0.9
-    elif fcf_ratio > 0:
-        fcf_score = 0.7
-    else:
-        fcf_score = 0.4
-    scores.append(fcf_score)
-    
-    return np.mean(scores) * 20
-
-
-def calculate_profitability(data):
-    scores = []
-    pm = data['profit_margin']
-    if pm > 0.30:  # Exceptional - very few companies
-        pm_score = 1.0
-    elif pm > 0.20:  # Great
-        pm_score = 0.75
-    elif pm > 0.12:  # Good
-        pm_score = 0.55
-    elif pm > 0.06:  # Average
-        pm_score = 0.35
-    else:
-        pm_score = max(0.15, pm * 3)
-    scores.append(pm_score)
-    
-    om = data['operating_margin']
-    if om > 0.35:  # Exceptional
-        om_score = 1.0
-    elif om > 0.25:  # Great
-        om_score = 0.75
-    elif om > 0.15:  # Good
-        om_score = 0.55
-    elif om > 0.08:  # Average
-        om_score = 0.35
-    else:
-        om_score = max(0.15, om * 2.5)
-    scores.append(om_score)
-    
-    roe = data['roe']
-    if roe > 0.25:  # Exceptional
-        roe_score = 1.0
-    elif roe > 0.18:  # Great
-        roe_score = 0.75
-    elif roe > 0.12:  # Good
-        roe_score = 0.55
-    elif roe > 0.06:  # Average
-        roe_score = 0.35
-    else:
-        roe_score = max(0.15, roe * 2.5)
-    scores.append(roe_score)
-    
-    return np.mean(scores) * 20
-
-
-def calculate_growth(data):
-    scores = []
-    rev = data['revenue_growth']
-    if rev > 0.2:
-        rev_score = 1.0
-    elif rev > 0.1:
-        rev_score = 0.8
-    elif rev > 0.05:
-        rev_score = 0.65
-    elif rev > 0:
-        rev_score = 0.5
-    else:
-        rev_score = 0.35
-    scores.append(rev_score)
-    
-    earn = data['earnings_growth']
-    if earn > 0.2:
-        earn_score = 1.0
-    elif earn > 0.1:
-        earn_score = 0.8
-    elif earn > 0.05:
-        earn_score = 0.65
-    elif earn > 0:
-        earn_score = 0.5
-    else:
-        earn_score = 0.35
-    scores.append(earn_score)
-    
-    scores.append(0.65)
-    return np.mean(scores) * 20
-
+# ============ SCREEN FUNCTIONS ============
 
-def calculate_momentum(data):
-    try:
-        hist = data['hist']
-        if hist is None or hist.empty:
-            return 12.0
-        
-        scores = []
-        spy = yf.Ticker('SPY')
-        spy_hist = spy.history(period='1y')
-        
-        # 1-month momentum - more balanced
-        if len(hist) >= 21:
-            stock_1m = (hist['Close'].iloc[-1] / hist['Close'].iloc[-21] - 1)
-            spy_1m = (spy_hist['Close'].iloc[-1] / spy_hist['Close'].iloc[-21] - 1)
-            rel_momentum = stock_1m - spy_1m
-            
-            if rel_momentum > 0.08:
-                score_1m = 1.0
-            elif rel_momentum > 0.03:
-                score_1m = 0.85
-            elif rel_momentum > -0.02:
-                score_1m = 0.7
-            elif rel_momentum > -0.06:
-                score_1m = 0.55
-            else:
-                score_1m = 0.4
-            scores.append(score_1m)
-        
-        # 3-month momentum - more balanced
-        if len(hist) >= 63:
-            stock_3m = (hist['Close'].iloc[-1] / hist['Close'].iloc[-63] - 1)
-            spy_3m = (spy_hist['Close'].iloc[-1] / spy_hist['Close'].iloc[-63] - 1)
-            rel_momentum = stock_3m - spy_3m
-            
-            if rel_momentum > 0.15:
-                score_3m = 1.0
-            elif rel_momentum > 0.05:
-                score_3m = 0.85
-            elif rel_momentum > -0.05:
-                score_3m = 0.7
-            elif rel_momentum > -0.12:
-                score_3m = 0.55
-            else:
-                score_3m = 0.4
-            scores.append(score_3m)
-        
-        return np.mean(scores) * 20 if scores else 12.0
-    except:
-        return 12.0
+def select_symbol(input_key, ticker):
+    """Fill a ticker input with a chosen suggestion"""
+    st.session_state[input_key] = ticker
 
 
-def calculate_stability(data):
-    scores = []
-    
-    # Beta scoring - more generous
-    beta = data['beta']
-    if beta < 0.7:
-        beta_score = 1.0
-    elif beta < 1.0:
-        beta_score = 0.85
-    elif beta < 1.3:
-        beta_score = 0.7
-    elif beta < 1.6:
-        beta_score = 0.55
-    else:
-        beta_score = 0.4
-    scores.append(beta_score)
-    
-    # 52-week range volatility - more balanced
-    high = data['fifty_two_week_high']
-    low = data['fifty_two_week_low']
-    price = data['price']
-    
-    if high > 0 and low > 0 and price > 0:
-        vol_range = (high - low) / low
-        if vol_range < 0.25:
-            vol_score = 1.0
-        elif vol_range < 0.4:
-            vol_score = 0.85
-        elif vol_range < 0.6:
-            vol_score = 0.7
-        elif vol_range < 0.85:
-            vol_score = 0.55
-        else:
-            vol_score = 0.4
-        scores.append(vol_score)
-    
-    # Drawdown - more forgiving
+def show_symbol_suggestions(query, input_key):
+    """Matching tickers and company names for a partly typed ticker input"""
+    if not query:
+        return
     try:
-        hist = data['hist']
-        if hist is not None and not hist.empty:
-            rolling_max = hist['Close'].expanding().max()
-            drawdown = (hist['Close'] - rolling_max) / rolling_max
-            max_dd = abs(drawdown.min())
-            
-            if max_dd < 0.12:
-                dd_score = 1.0
-            elif max_dd < 0.20:
-                dd_score = 0.85
-            elif max_dd < 0.30:
-                dd_score = 0.7
-            elif max_dd < 0.45:
-                dd_score = 0.55
-            else:
-                dd_score = 0.4
-            scores.append(dd_score)
-    except:
-        scores.append(0.7)
-    
-    return np.mean(scores) * 20
-
-
-def score_stock(ticker):
-    data = get_stock_data(ticker)
-    
-    if data is None:
-        return None
-    
-    financial_health = calculate_financial_health(data)
-    profitability = calculate_profitability(data)
-    growth = calculate_growth(data)
-    momentum = calculate_momentum(data)
-    stability = calculate_stability(data)
-    
-    final_score = financial_health + profitability + growth + momentum + stability
-    price_change = ((data['price'] - data['prev_close']) / data['prev_close']) * 100
-    
-    return {
-        'ticker': ticker,
-        'company_name': data['company_name'],
-        'logo_url': data['logo_url'],
-        'sector': data['sector'],
-        'price': data['price'],
-        'price_change': price_change,
-        'financial_health': round(financial_health, 1),
-        'profitability': round(profitability, 1),
-        'growth': round(growth, 1),
-        'momentum': round(momentum, 1),
-        'stability': round(stability, 1),
-        'final_score': round(final_score, 1),
-        'hist': data['hist']
-    }
-
-
-def calculate_portfolio_score(stock_scores):
-    if not stock_scores:
-        return 0
-    
-    avg_score = np.mean([s['final_score'] for s in stock_scores])
-    
-    sectors = set(s['sector'] for s in stock_scores)
-    num_sectors = len(sectors)
-    if num_sectors <= 1:
-        div_adj = 0.88
-    elif num_sectors >= 5:
-        div_adj = 1.0
-    else:
-        div_adj = 0.88 + (num_sectors - 1) * 0.03
-    
-    weighted_stability = np.mean([s['stability'] for s in stock_scores])
-    stab_adj = 0.92 + (weighted_stability / 20) * 0.08
-    
-    portfolio_score = avg_score * div_adj * stab_adj
-    
-    return round(portfolio_score, 1)
-
-
-def generate_insights(stock_scores):
-    insights = []
-    
-    if not stock_scores:
-        return insights
-    
-    sorted_stocks = sorted(stock_scores, key=lambda x: x['final_score'], reverse=True)
-    best = sorted_stocks[0]
-    worst = sorted_stocks[-1]
-    
-    insights.append(f"Top performer: {best['company_name']} ({best['final_score']}/100)")
-    
-    if len(stock_scores) > 1:
-        insights.append(f"Needs attention: {worst['company_name']} ({worst['final_score']}/100)")
-    
-    avg_momentum = np.mean([s['momentum'] for s in stock_scores])
-    if avg_momentum > 15:
-        insights.append(f"Strong momentum across portfolio")
-    elif avg_momentum < 8:
-        insights.append(f"Weak momentum detected")
-    
-    positive_movers = sum(1 for s in stock_scores if s['price_change'] > 0)
-    if positive_movers > len(stock_scores) / 2:
-        insights.append(f"{positive_movers} of {len(stock_scores)} stocks gained today")
+        directory = get_symbol_directory()
+    except Exception:
+        return
+    if query in directory:
+        return
     
-    return insights
-
+    for ticker, name in directory.search(query, limit=5):
+        st.button(
+            f"{ticker} · {name}",
+            key=f"{input_key}_suggestion_{ticker}",
+            on_click=select_symbol,
+            args=(input_key, ticker),
+            use_container_width=True
+        )
 
-# ============ SCREEN FUNCTIONS ============
 
 def show_welcome():
     """Welcome screen"""
@@ -792,6 +555,9 @@ def show_welcome():
 
 def show_add_stocks():
     """Add stocks screen"""
+    # Start loading the symbol directory before the first keystroke needs it
+    get_symbol_directory()
+    
     st.markdown('<div class="welcome-title" style="text-align: center; font-size: 48px; margin-bottom: 30px; color: #343967;">Add Your Stocks</div>', unsafe_allow_html=True)
     
     # Initialize shares dict if not exists
@@ -806,7 +572,7 @@ def show_add_stocks():
     with col2:
         if st.session_state.portfolio:
             if st.button("Continue to Dashboard", use_container_width=True):
-                st.session_state.screen = 'calculating'
+                start_scoring()
                 st.rerun()
     
     st.markdown("<br>", unsafe_allow_html=True)
@@ -817,6 +583,7 @@ def show_add_stocks():
         with col2:
             st.markdown('<div class="section-header">Add New Stock</div>', unsafe_allow_html=True)
             ticker_input = st.text_input("Stock ticker (e.g., AAPL, TSLA)", key="ticker_input").upper()
+            show_symbol_suggestions(ticker_input, "ticker_input")
             shares_input = st.number_input("Number of shares (optional)", min_value=0.0, value=0.0, step=0.1, format="%.3f", key="shares_input", help="Leave as 0 if you don't want to track shares")
             
             if st.button("Add to Portfolio", use_container_width=True):
@@ -827,11 +594,8 @@ def show_add_stocks():
                         # Validate ticker first
                         with st.spinner('Validating...'):
                             try:
-                                test_stock = yf.Ticker(ticker_input)
-                                test_hist = test_stock.history(period="5d")
-                                
-                                # Check if we got valid price data
-                                if test_hist.empty or len(test_hist) == 0:
+                                # Listed symbols are checked in memory, others against Yahoo
+                                if not is_valid_symbol(ticker_input):
                                     st.error(f"Stock not available")
                                 else:
                                     # Stock is valid - add to portfolio with shares
@@ -852,16 +616,21 @@ def show_add_stocks():
     if st.session_state.portfolio:
         st.markdown('<div class="section-header">Your Portfolio</div>', unsafe_allow_html=True)
         
+        # Daily change for every ticker, from one batched request shared across reruns
+        try:
+            quotes = get_quotes(st.session_state.portfolio)
+        except Exception:
+            quotes = {}
+        
         for ticker in st.session_state.portfolio:
             shares = st.session_state.shares.get(ticker)
             
             # Get stock data for daily change
             try:
-                stock = yf.Ticker(ticker)
-                hist = stock.history(period="5d")
-                if not hist.empty and len(hist) >= 2:
-                    current_price = hist['Close'].iloc[-1]
-                    prev_price = hist['Close'].iloc[-2]
+                quote = quotes.get(ticker)
+                if quote:
+                    current_price = quote['price']
+                    prev_price = quote['prev_close']
                     price_change = current_price - prev_price
                     price_change_pct = (price_change / prev_price) * 100
                     
@@ -901,38 +670,61 @@ def show_add_stocks():
 
 
 
-def show_calculating():
-    """Loading screen - Blue with logo"""
-    logo_html = f'<img src="data:image/png;base64,{LOGO_BASE64}" style="width: 100px; height: 100px; border-radius: 16px;"/>' if LOGO_BASE64 else '<svg width=100 height=100 viewBox="0 0 150 150" fill="none"><path d="M75 20L50 60V130H75V130H100V60L75 20Z" fill="#F9F8F6"/><path d="M35 40L20 60V130H35V130H50V60L35 40Z" fill="#F9F8F6"/><path d="M115 40L100 60V130H115V130H130V60L115 40Z" fill="#F9F8F6"/></svg>'
-    
-    st.markdown(f"""
-        <div class="loading-content">
-            <div class="loading-logo">
-                {logo_html}
-            </div>
-            <div class="loading-text">Mercato</div>
-            <div class="loading-subtext">The market made simple</div>
-        </div>
-    """, unsafe_allow_html=True)
-    
-    progress_bar = st.progress(0)
-    stock_scores = []
-    total = len(st.session_state.portfolio)
+def start_scoring():
+    """Open the dashboard and stream in scores for new or stale tickers"""
+    st.session_state.scoring = True
+    st.session_state.timed_out = []
+    st.session_state.screen = 'dashboard'
+
+
+@timed('load.stream_scores')
+def stream_scores(summary_slot, stocks_slot):
+    """Load and score new or stale tickers, redrawing the dashboard as they land
+    
+    Tickers still loading after SCORE_TIMEOUT seconds are marked timed out
+    instead of holding up the page.
+    """
+    stock_scores = st.session_state.stock_scores
+    portfolio = st.session_state.portfolio
+    scored_at = st.session_state.scored_at
+    histories = {s['ticker']: s['hist'] for s in stock_scores}
+    pending = [t for t in portfolio if t not in histories]
+    done = set()
+    last_draw = time.monotonic()
     
-    for i, ticker in enumerate(st.session_state.portfolio):
-        progress_bar.progress((i + 1) / total)
-        score = score_stock(ticker)
-        if score:
-            stock_scores.append(score)
+    try:
+        for ticker, data in iter_stock_data(portfolio, histories, timeout=SCORE_TIMEOUT, scored_at=scored_at):
+            done.add(ticker)
+            scored_at[ticker] = time.time()
+            if data is not None:
+                rescore_stocks(stock_scores, {ticker: data}, portfolio)
+            if time.monotonic() - last_draw > REDRAW_INTERVAL:
+                draw_dashboard(summary_slot, stocks_slot, [t for t in pending if t not in done])
+                last_draw = time.monotonic()
+    except Exception as e:
+        st.error(f"Error fetching portfolio data: {e}")
     
-    st.session_state.stock_scores = stock_scores
-    st.session_state.screen = 'dashboard'
-    st.rerun()
+    # Drop anything that left the portfolio even if nothing was rescored
+    rescore_stocks(stock_scores, {}, portfolio)
+    st.session_state.timed_out = [t for t in pending if t not in done]
+
+
+@timed('render.draw_dashboard')
+def draw_dashboard(summary_slot, stocks_slot, pending=(), interactive=False):
+    """Render the portfolio summary and stock cards into their placeholders"""
+    with summary_slot.container():
+        show_portfolio_summary(st.session_state.stock_scores, pending)
+    with stocks_slot.container():
+        if len(st.session_state.portfolio) > CARD_LIMIT:
+            show_stock_table(st.session_state.stock_scores, pending, st.session_state.timed_out, interactive)
+        else:
+            show_stock_cards(st.session_state.stock_scores, pending, st.session_state.timed_out, interactive)
 
 
 def show_dashboard():
-    """Main dashboard"""
-    if not st.session_state.stock_scores:
+    """Main dashboard, drawn at once and filled in while scores stream in"""
+    scoring = st.session_state.scoring
+    if not st.session_state.stock_scores and not scoring:
         st.session_state.screen = 'add_stocks'
         st.rerun()
         return
@@ -956,18 +748,38 @@ def show_dashboard():
             st.session_state.screen = 'manage'
             st.rerun()
     with col2:
-        if st.button("Refresh Scores", use_container_width=True):
-            st.session_state.screen = 'calculating'
-            st.rerun()
+        # A callback, since st.rerun() would replay this click on the dashboard again
+        st.button("Refresh Scores", use_container_width=True, on_click=start_scoring)
     
     st.markdown("<br>", unsafe_allow_html=True)
     
+    summary_slot = st.empty()
+    stocks_slot = st.empty()
+    scored = {s['ticker'] for s in st.session_state.stock_scores}
+    pending = [t for t in st.session_state.portfolio if t not in scored] if scoring else []
+    draw_dashboard(summary_slot, stocks_slot, pending, interactive=not scoring)
+    
+    if scoring:
+        stream_scores(summary_slot, stocks_slot)
+        st.session_state.scoring = False
+        st.rerun()
+
+
+@timed('render.show_portfolio_summary')
+def show_portfolio_summary(stock_scores, pending=()):
+    """Portfolio value, health score gauge and insights"""
+    if pending:
+        scored = len(st.session_state.portfolio) - len(pending)
+        st.markdown(f'<div class="insight-card"><div class="insight-text">Scoring your portfolio... {scored} of {len(st.session_state.portfolio)} stocks ready</div></div>', unsafe_allow_html=True)
+    if not stock_scores:
+        return
+    
     # Calculate portfolio value and daily change
     total_value = 0
     total_daily_change = 0
     stocks_with_shares = 0
     
-    for stock in st.session_state.stock_scores:
+    for stock in stock_scores:
         ticker = stock['ticker']
         shares = st.session_state.shares.get(ticker)
         
@@ -1005,8 +817,9 @@ def show_dashboard():
             </div>
         """, unsafe_allow_html=True)
     
-    # Portfolio Health Score
-    portfolio_score = calculate_portfolio_score(st.session_state.stock_scores)
+    # Portfolio Health Score, weighted by position size when shares are tracked
+    analytics = analyze_portfolio(stock_scores, st.session_state.shares, st.session_state.risk_model)
+    portfolio_score = calculate_portfolio_score(stock_scores, analytics)
     
     # Create gauge chart
     fig_gauge = go.Figure(go.Indicator(
@@ -1056,17 +869,35 @@ def show_dashboard():
         </div>
     """, unsafe_allow_html=True)
     
+    if analytics['volatility'] is not None:
+        st.markdown(f"""
+            <div style="text-align: center; color: #343967; font-size: 16px; margin-top: -30px; margin-bottom: 40px;">
+                {analytics['volatility'] * 100:.1f}% annual volatility • {analytics['effective_bets']:.1f} effective bets across {len(analytics['correlation'])} holdings
+            </div>
+        """, unsafe_allow_html=True)
+    
     # Insights
     st.markdown('<div class="section-header">Daily Insights</div>', unsafe_allow_html=True)
     
-    insights = generate_insights(st.session_state.stock_scores)
+    insights = generate_insights(stock_scores)
+    if analytics['most_correlated'] and analytics['most_correlated'][2] >= HIGH_CORRELATION:
+        first, second, correlation = analytics['most_correlated']
+        insights.append(f"{first} and {second} move closely together ({correlation:.2f} correlation)")
     for insight in insights:
         st.markdown(f'<div class="insight-card"><div class="insight-text">{insight}</div></div>', unsafe_allow_html=True)
     
-    # Stock List
+
+
+@timed('render.show_stock_cards')
+def show_stock_cards(stock_scores, pending=(), timed_out=(), interactive=True):
+    """Scored stocks best first, then placeholders for ones still loading or timed out
+    
+    View Details buttons are left out while scores stream in, since the
+    cards are redrawn several times in one run.
+    """
     st.markdown('<div class="section-header">Your Stocks</div>', unsafe_allow_html=True)
     
-    sorted_stocks = sorted(st.session_state.stock_scores, key=lambda x: x['final_score'], reverse=True)
+    sorted_stocks = sorted(stock_scores, key=lambda x: x['final_score'], reverse=True)
     
     for stock in sorted_stocks:
         col1, col2 = st.columns([4, 1])
@@ -1105,13 +936,7 @@ def show_dashboard():
             
             # Sub-scores
             cols = st.columns(5)
-            subscores = [
-                ('Financial', stock['financial_health']),
-                ('Profit', stock['profitability']),
-                ('Growth', stock['growth']),
-                ('Momentum', stock['momentum']),
-                ('Stability', stock['stability'])
-            ]
+            subscores = [(label, stock[key]) for label, key in SUBSCORES]
             
             for col, (label, score) in zip(cols, subscores):
                 with col:
@@ -1128,14 +953,107 @@ def show_dashboard():
         
         with col2:
             st.markdown(f'<div class="stock-score" style="padding-top: 20px;">{stock["final_score"]}</div>', unsafe_allow_html=True)
-            if st.button("View Details", key=f"view_{stock['ticker']}", use_container_width=True):
+            if interactive and st.button("View Details", key=f"view_{stock['ticker']}", use_container_width=True):
                 st.session_state.selected_stock = stock['ticker']
                 st.session_state.screen = 'stock_detail'
                 st.rerun()
         
         st.markdown("<br>", unsafe_allow_html=True)
+    
+    for ticker, status in [(t, "Scoring...") for t in pending] + [(t, "Timed out - refresh to try again") for t in timed_out]:
+        st.markdown(f"""
+            <div class="stock-card">
+                <div class="company-info">
+                    <div class="company-name">{ticker}</div>
+                    <div class="stock-ticker">{status}</div>
+                </div>
+            </div>
+        """, unsafe_allow_html=True)
+        st.markdown("<br>", unsafe_allow_html=True)
 
 
+def stock_table_row(stock):
+    """One stock as a row of the stock table"""
+    change_class = "price-change-positive" if stock["price_change"] >= 0 else "price-change-negative"
+    sign = "+" if stock["price_change"] >= 0 else ""
+    
+    position = ""
+    shares = st.session_state.shares.get(stock['ticker'])
+    if shares and shares > 0:
+        daily_change = stock["price_change"] / 100 * stock["price"] * shares
+        position_class = "price-change-positive" if daily_change >= 0 else "price-change-negative"
+        sign_dollar = "+" if daily_change >= 0 else "-"
+        position = f'{shares} shares <span class="{position_class}">{sign_dollar}${abs(daily_change):.2f}</span>'
+    
+    bars = "".join(
+        f'<td><div class="subscore-bar" title="{label} {stock[key]}"><div class="subscore-fill" style="width: {(stock[key]/20)*100}%"></div></div></td>'
+        for label, key in SUBSCORES
+    )
+    return (
+        f'<tr><td><img src="{stock["logo_url"]}" class="company-logo" onerror="this.style.display=\'none\'"/>'
+        f'{stock["company_name"]} <span class="stock-ticker">{stock["ticker"]}</span></td>'
+        f'<td>${stock["price"]:.2f}</td><td class="{change_class}">{sign}{stock["price_change"]:.2f}%</td>'
+        f'<td>{position}</td>{bars}<td class="table-score">{stock["final_score"]}</td></tr>'
+    )
+
+
+@timed('render.show_stock_table')
+def show_stock_table(stock_scores, pending=(), timed_out=(), interactive=True):
+    """Stocks as one sortable table a page at a time, for portfolios too big for cards
+    
+    Each page goes out as a single markdown element, so a rerun costs about
+    the same however many stocks are held. Sorting, paging and the detail
+    selector are widgets, so like View Details they wait until scoring ends.
+    """
+    st.markdown('<div class="section-header">Your Stocks</div>', unsafe_allow_html=True)
+    
+    rows = len(stock_scores) + len(pending) + len(timed_out)
+    pages = max(1, math.ceil(rows / TABLE_PAGE_SIZE))
+    st.session_state.stock_page = min(st.session_state.stock_page, pages)
+    
+    if interactive:
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            sorts = list(TABLE_SORTS)
+            st.session_state.stock_sort = st.selectbox(
+                "Sort by", sorts, key="table_sort", index=sorts.index(st.session_state.stock_sort)
+            )
+        with col2:
+            st.session_state.stock_page = st.number_input(
+                f"Page (of {pages})", min_value=1, max_value=pages, value=st.session_state.stock_page, step=1,
+                key="table_page"
+            )
+    
+    key, descending = TABLE_SORTS[st.session_state.stock_sort]
+    sorted_stocks = sorted(stock_scores, key=lambda x: x[key], reverse=descending)
+    row_html = [stock_table_row(stock) for stock in sorted_stocks]
+    row_html += [
+        f'<tr><td><span class="stock-ticker">{ticker}</span></td><td colspan="9">{status}</td></tr>'
+        for ticker, status in [(t, "Scoring...") for t in pending] + [(t, "Timed out - refresh to try again") for t in timed_out]
+    ]
+    
+    start = (st.session_state.stock_page - 1) * TABLE_PAGE_SIZE
+    header = "".join(f"<th>{label}</th>" for label in ["Stock", "Price", "Change", "Position"] + [label for label, _ in SUBSCORES])
+    st.markdown(
+        f'<table class="stock-table"><tr>{header}<th style="text-align: right;">Score</th></tr>'
+        + "".join(row_html[start:start + TABLE_PAGE_SIZE]) + '</table>',
+        unsafe_allow_html=True
+    )
+    
+    if interactive and sorted_stocks:
+        st.markdown("<br>", unsafe_allow_html=True)
+        labels = {f"{stock['ticker']} - {stock['company_name']}": stock['ticker'] for stock in sorted_stocks}
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            selected = st.selectbox("Stock details", list(labels), key="table_detail", label_visibility="collapsed")
+        with col2:
+            if st.button("View Details", key="view_table", use_container_width=True):
+                st.session_state.selected_stock = labels[selected]
+                st.session_state.screen = 'stock_detail'
+                st.rerun()
+
+
+@timed('render.show_stock_detail')
 def show_stock_detail():
     """Stock detail screen"""
     if not st.session_state.selected_stock:
@@ -1266,6 +1184,49 @@ def show_stock_detail():
             </div>
         """, unsafe_allow_html=True)
     
+    # Daily scores over the last year, backfilled from stored bars
+    scores = score_history(stock['ticker'])
+    if len(scores) > 1:
+        st.markdown('<div class="section-header">Score History</div>', unsafe_allow_html=True)
+        
+        fig = go.Figure()
+        fig.add_trace(go.Scatter(
+            x=scores.index,
+            y=scores['final_score'],
+            mode='lines',
+            name='Score',
+            line=dict(color='#343967', width=3),
+            hovertemplate='<b>%{x|%B %d, %Y}</b><br>Score: %{y:.1f}<extra></extra>'
+        ))
+        fig.update_layout(
+            height=320,
+            margin=dict(l=65, r=40, t=20, b=60),
+            plot_bgcolor='white',
+            paper_bgcolor='#e6e0d5',
+            hovermode='x unified',
+            showlegend=False,
+            font=dict(family='Georgia', color='#343967', size=14)
+        )
+        fig.update_xaxes(
+            showgrid=True,
+            gridcolor='rgba(52, 57, 103, 0.05)',
+            showline=True,
+            linecolor='#343967',
+            linewidth=1.5,
+            tickformat='%b %d<br>%Y',
+            tickfont=dict(size=11, family='Georgia', color='#343967')
+        )
+        fig.update_yaxes(
+            range=[0, 100],
+            showgrid=True,
+            gridcolor='rgba(52, 57, 103, 0.05)',
+            showline=True,
+            linecolor='#343967',
+            linewidth=1.5,
+            tickfont=dict(size=12, family='Georgia', color='#343967')
+        )
+        st.plotly_chart(fig, use_container_width=True)
+    
     st.markdown('<div class="section-header">Price Chart</div>', unsafe_allow_html=True)
     
     # Chart view toggle
@@ -1298,8 +1259,8 @@ def show_stock_detail():
     periods = {"1 Day": "1d", "1 Week": "5d", "1 Month": "1mo", "3 Months": "3mo", "6 Months": "6mo", "1 Year": "1y"}
     intervals = {"1 Day": "5m", "1 Week": "15m", "1 Month": "1h", "3 Months": "1d", "6 Months": "1d", "1 Year": "1d"}
     
-    ticker_obj = yf.Ticker(stock['ticker'])
-    hist = ticker_obj.history(period=periods[timeframe], interval=intervals[timeframe])
+    # Daily views are cut from the history we scored with; intraday bars are cached per interval
+    hist = get_chart_history(stock['ticker'], periods[timeframe], intervals[timeframe], daily_hist=stock.get('hist'))
     
     if not hist.empty:
         fig = go.Figure()
@@ -1332,13 +1293,7 @@ def show_stock_detail():
                 increasing_fillcolor='#10b981',
                 decreasing_fillcolor='#ef4444',
                 increasing_line_width=2,
-                decreasing_line_width=2,
-                hovertemplate='<b>%{x|%B %d, %I:%M %p}</b><br><br>' +
-                             'Open: $%{open:.2f}<br>' +
-                             'High: $%{high:.2f}<br>' +
-                             'Low: $%{low:.2f}<br>' +
-                             'Close: $%{close:.2f}<br>' +
-                             '<extra></extra>'
+                decreasing_line_width=2
             ))
             
             chart_type = "Candlestick Chart"
@@ -1417,6 +1372,7 @@ def show_manage():
             
         st.markdown('<div class="section-header">Add Stocks</div>', unsafe_allow_html=True)
         ticker_input = st.text_input("Enter ticker", key="manage_ticker").upper()
+        show_symbol_suggestions(ticker_input, "manage_ticker")
         shares_input = st.number_input("Number of shares", min_value=0.001, value=1.0, step=0.1, format="%.3f", key="manage_shares")
         
         if st.button("Add Stock", key="add_manage", use_container_width=True):
@@ -1427,11 +1383,8 @@ def show_manage():
                     # Validate ticker first
                     with st.spinner('Validating...'):
                         try:
-                            test_stock = yf.Ticker(ticker_input)
-                            test_hist = test_stock.history(period="5d")
-                            
-                            # Check if we got valid price data
-                            if test_hist.empty or len(test_hist) == 0:
+                            # Listed symbols are checked in memory, others against Yahoo
+                            if not is_valid_symbol(ticker_input):
                                 st.error(f"Stock not available")
                             else:
                                 # Stock is valid - add to portfolio with shares
@@ -1459,11 +1412,72 @@ def show_manage():
         
         st.markdown("<br><br>", unsafe_allow_html=True)
         
+        # Company fundamentals are cached for a day; this forces a fresh pull
+        if st.button("Reload Company Data", use_container_width=True, help="Refetch financials like debt, margins and growth on the next refresh"):
+            invalidate_fundamentals(st.session_state.portfolio)
+            st.success("Company data will be reloaded on the next refresh")
+        
         if st.button("← Back to Dashboard", use_container_width=True):
-            st.session_state.screen = 'dashboard'
+            start_scoring()
             st.rerun()
 
 
+def debug_enabled():
+    """The metrics panel is opt-in: open the app with ?debug=1 or set MERCATO_DEBUG=1"""
+    return st.query_params.get('debug') == '1' or os.environ.get('MERCATO_DEBUG', '0') != '0'
+
+
+def show_debug_panel():
+    """Stage latencies, slowest tickers, cache hit rates and provider errors for this process"""
+    stages, tickers, counters = get_metrics().snapshot()
+    with st.expander("Debug: metrics", expanded=False):
+        st.caption(f"Since {datetime.fromtimestamp(get_metrics().started_at):%H:%M:%S}, across every session of this server")
+        
+        if stages:
+            st.dataframe(pd.DataFrame(summarize(stages)).round(2), hide_index=True, use_container_width=True)
+        else:
+            st.caption("Nothing recorded yet")
+        
+        provider = {
+            f"{ticker} ({stage.split('.', 1)[1]})": hist
+            for stage, hists in tickers.items() if stage.startswith('provider.')
+            for ticker, hist in hists.items()
+        }
+        if provider:
+            st.markdown("**Slowest tickers**")
+            st.dataframe(pd.DataFrame(summarize(provider)[:10]).round(2), hide_index=True, use_container_width=True)
+        
+        caches = {}
+        errors = []
+        for (name, labels), value in counters.items():
+            labels = dict(labels)
+            if name in ('cache_hits', 'cache_misses'):
+                caches.setdefault(labels['cache'], {'hits': 0, 'misses': 0})[name[6:]] = value
+            elif name == 'provider_errors':
+                errors.append({'call': labels['call'], 'kind': labels['kind'], 'count': value})
+        if caches:
+            st.markdown("**Caches**")
+            st.dataframe(pd.DataFrame([
+                {'cache': cache, **c, 'hit_rate': c['hits'] / (c['hits'] + c['misses'])}
+                for cache, c in sorted(caches.items()) if c['hits'] + c['misses']
+            ]).round(3), hide_index=True, use_container_width=True)
+        
+        fetch_stats = get_fetcher().stats.snapshot()
+        st.markdown("**Provider**")
+        st.caption(", ".join(f"{event} {value}" for event, value in fetch_stats.items()))
+        if errors:
+            st.dataframe(pd.DataFrame(sorted(errors, key=lambda e: -e['count'])), hide_index=True, use_container_width=True)
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button(
+                "Download Prometheus metrics", render_prometheus(fetch_stats), file_name="mercato_metrics.txt",
+                mime="text/plain", use_container_width=True
+            )
+        with col2:
+            st.button("Reset metrics", on_click=get_metrics().reset, use_container_width=True)
+
+
 def main():
     if 'screen' not in st.session_state:
         st.session_state.screen = 'welcome'
@@ -1471,21 +1485,36 @@ def main():
         st.session_state.portfolio = []
     if 'stock_scores' not in st.session_state:
         st.session_state.stock_scores = []
+    if 'scored_at' not in st.session_state:
+        st.session_state.scored_at = {}
     if 'selected_stock' not in st.session_state:
         st.session_state.selected_stock = None
+    if 'scoring' not in st.session_state:
+        st.session_state.scoring = False
+    if 'timed_out' not in st.session_state:
+        st.session_state.timed_out = []
+    if 'shares' not in st.session_state:
+        st.session_state.shares = {}
+    if 'risk_model' not in st.session_state:
+        st.session_state.risk_model = RiskModel()
+    if 'stock_sort' not in st.session_state:
+        st.session_state.stock_sort = 'Score'
+    if 'stock_page' not in st.session_state:
+        st.session_state.stock_page = 1
     
     if st.session_state.screen == 'welcome':
         show_welcome()
     elif st.session_state.screen == 'add_stocks':
         show_add_stocks()
-    elif st.session_state.screen == 'calculating':
-        show_calculating()
     elif st.session_state.screen == 'dashboard':
         show_dashboard()
     elif st.session_state.screen == 'stock_detail':
         show_stock_detail()
     elif st.session_state.screen == 'manage':
         show_manage()
+    
+    if debug_enabled():
+        show_debug_panel()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,324 @@
+"""
+Mercato backtests
+Whether final_score picks stocks that go on to do well: holds the top-N
+scored names of a universe, rebalanced on a schedule, over years of stored
+prices, for a whole grid of parameters spread across a process pool
+
+    python mercato_backtest.py                    # S&P 500, 5 years, default grid
+    python mercato_backtest.py --top 10 25 --rebalance M Q --cost-bps 0 10 --workers 8
+
+Every day is scored by the score history backfill, with the same vectorized
+ladders as today's score. Two biases to keep in mind: the universe is
+today's constituents, and fundamentals are the current ones except where
+earlier backfills recorded them
+"""
+
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from multiprocessing import get_context
+
+import numpy as np
+import pandas as pd
+
+from mercato_data import DEFAULT_BENCHMARK, extend_price_histories, get_price_store, load_fundamentals
+from mercato_history import backfill_scores
+from mercato_providers import period_start
+from mercato_store import DATA_DIR
+
+BACKTEST_PERIOD = '5y'
+RESULTS_DIR = os.path.join(DATA_DIR, 'backtests')
+TRADING_DAYS = 252
+# Rebalance schedules, as pandas period frequencies
+REBALANCE_FREQUENCIES = {'W': 'W', 'M': 'M', 'Q': 'Q'}
+WEIGHTINGS = ['equal', 'score']
+
+# One backtest's parameters; a grid varies any of them
+DEFAULT_CONFIG = {
+    'top_n': 20,
+    'rebalance': 'M',
+    'min_score': 0.0,
+    'weighting': 'equal',
+    'cost_bps': 10.0,
+    # Trading days between the scores a rebalance uses and the close it trades at
+    'lag': 1
+}
+DEFAULT_GRID = {
+    'top_n': [10, 20, 50, 100],
+    'rebalance': ['W', 'M', 'Q'],
+    'min_score': [0.0, 50.0],
+    'weighting': WEIGHTINGS,
+    'cost_bps': [0.0, 10.0]
+}
+METRICS = [
+    'start', 'end', 'total_return', 'annual_return', 'volatility', 'sharpe', 'max_drawdown',
+    'turnover', 'holdings', 'benchmark_return', 'excess_return'
+]
+
+# The panel each pool worker simulates against, handed over once when it starts
+_worker_panel = None
+
+
+class Panel:
+    """Daily closes and final scores of a universe, one row per date and one column per ticker
+
+    Closes are forward-filled over gaps and NaN before a ticker's first bar,
+    and quoted marks the days a ticker has a bar it can trade at. growth
+    holds the value of 1.0 put into each ticker on the first date, so any
+    holding period's return is a ratio of two rows.
+    """
+
+    def __init__(self, dates, tickers, closes, scores, benchmark=None):
+        self.dates = dates
+        self.tickers = list(tickers)
+        self.quoted = ~np.isnan(closes)
+        self.closes = pd.DataFrame(closes).ffill().to_numpy()
+        self.scores = scores
+        self.benchmark = None if benchmark is None else pd.Series(benchmark).ffill().to_numpy()
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            returns = self.closes[1:] / self.closes[:-1] - 1
+        returns[~np.isfinite(returns)] = 0.0
+        self.growth = np.vstack([np.ones(len(self.tickers)), np.cumprod(1 + returns, axis=0)])
+
+    def __len__(self):
+        return len(self.dates)
+
+
+def load_panel(tickers, period=BACKTEST_PERIOD, benchmark=DEFAULT_BENCHMARK, workers=None):
+    """Stored closes and backfilled final scores of tickers over period, as a Panel
+
+    Bars missing from the local store are downloaded first, so a cold run
+    costs one batch download for the period plus each ticker's fundamentals.
+    The backfill is spread over workers processes (all cores by default).
+    """
+    tickers = list(dict.fromkeys(tickers))
+    extend_price_histories(tickers + [benchmark], period)
+    load_fundamentals(tickers)
+    history = backfill_scores(tickers, workers=workers or os.cpu_count() or 1)
+
+    columns = get_price_store().read_columns(tickers + [benchmark], start=period_start(period))
+    tickers = [t for t in tickers if t in columns]
+    dates = np.unique(np.concatenate([columns[t][1] for t in tickers])) if tickers else np.empty(0, dtype='datetime64[ns]')
+
+    closes = np.full((len(dates), len(tickers)), np.nan)
+    scores = np.full((len(dates), len(tickers)), np.nan)
+    for i, ticker in enumerate(tickers):
+        _, ticker_dates, bars = columns[ticker]
+        closes[np.searchsorted(dates, ticker_dates), i] = bars[:, 3]
+        if ticker in history:
+            scored = history[ticker]
+            scored = scored[scored.index >= pd.Timestamp(dates[0])] if len(dates) else scored.iloc[:0]
+            scores[np.searchsorted(dates, scored.index.to_numpy()), i] = scored['final_score'].to_numpy()
+
+    bench = None
+    if benchmark in columns:
+        _, bench_dates, bench_bars = columns[benchmark]
+        bench = np.full(len(dates), np.nan)
+        rows = np.isin(bench_dates, dates)
+        bench[np.searchsorted(dates, bench_dates[rows])] = bench_bars[rows, 3]
+    return Panel(dates, tickers, closes, scores, bench)
+
+
+def parameter_grid(grid=None):
+    """Every combination of the values in grid, each filled out with DEFAULT_CONFIG"""
+    grid = grid or DEFAULT_GRID
+    keys = list(grid)
+    return [{**DEFAULT_CONFIG, **dict(zip(keys, values))} for values in itertools.product(*grid.values())]
+
+
+def rebalance_days(dates, frequency):
+    """Row of the first trading day in each period of frequency"""
+    periods = pd.DatetimeIndex(dates).to_period(REBALANCE_FREQUENCIES[frequency]).asi8
+    return np.flatnonzero(np.r_[True, periods[1:] != periods[:-1]])
+
+
+def _annualized(total_return, days):
+    if days <= 0 or total_return <= -1:
+        return None
+    return float((1 + total_return) ** (TRADING_DAYS / days) - 1)
+
+
+def simulate(panel, config):
+    """Run one configuration over panel and return it with its METRICS
+
+    At each rebalance the top_n names scoring at least min_score lag days
+    earlier are bought at that day's close, equally or score weighted, and
+    held until the next one. cost_bps is charged on the value traded. The
+    run starts at the first rebalance with top_n scored names; without one
+    the metrics are None. turnover is the one-way fraction of the portfolio
+    traded per year, not counting the first purchase.
+    """
+    config = {**DEFAULT_CONFIG, **config}
+    top_n, lag, cost = int(config['top_n']), int(config['lag']), config['cost_bps'] / 10_000
+    result = dict(config, **dict.fromkeys(METRICS))
+
+    days = rebalance_days(panel.dates, config['rebalance'])
+    days = days[days >= lag]
+    eligible = [
+        ~np.isnan(panel.scores[t - lag]) & panel.quoted[t] & (panel.scores[t - lag] >= config['min_score'])
+        for t in days
+    ]
+    ready = [k for k, rows in enumerate(eligible) if rows.sum() >= top_n]
+    if not ready:
+        return result
+    days, eligible = days[ready[0]:], eligible[ready[0]:]
+    first = days[0]
+    if first >= len(panel) - 1:
+        return result
+
+    values = np.empty(len(panel) - first)
+    values[0] = 1.0
+    drifted = np.zeros(len(panel.tickers))
+    traded = holdings = 0.0
+    for k, t in enumerate(days):
+        end = days[k + 1] if k + 1 < len(days) else len(panel) - 1
+        signal = panel.scores[t - lag]
+        candidates = np.flatnonzero(eligible[k])
+        chosen = candidates[np.argsort(-signal[candidates], kind='stable')[:top_n]]
+
+        weights = np.zeros(len(panel.tickers))
+        if len(chosen):
+            if config['weighting'] == 'score' and signal[chosen].sum() > 0:
+                weights[chosen] = signal[chosen] / signal[chosen].sum()
+            else:
+                weights[chosen] = 1 / len(chosen)
+        change = np.abs(weights - drifted).sum()
+        if k > 0:
+            traded += change / 2
+        holdings += len(chosen)
+
+        nav = values[t - first] * (1 - cost * change)
+        values[t - first] = nav
+        if end <= t:
+            continue
+        with np.errstate(divide='ignore', invalid='ignore'):
+            growth = np.nan_to_num(panel.growth[t + 1:end + 1, chosen] / panel.growth[t, chosen])
+        values[t + 1 - first:end + 1 - first] = nav * (growth @ weights[chosen]) if len(chosen) else nav
+        drifted = np.zeros(len(panel.tickers))
+        if len(chosen) and growth[-1] @ weights[chosen] > 0:
+            drifted[chosen] = weights[chosen] * growth[-1] / (growth[-1] @ weights[chosen])
+
+    daily = values[1:] / values[:-1] - 1
+    total_return = float(values[-1] - 1)
+    deviation = float(daily.std())
+    result.update({
+        'start': str(pd.Timestamp(panel.dates[first]).date()),
+        'end': str(pd.Timestamp(panel.dates[-1]).date()),
+        'total_return': total_return,
+        'annual_return': _annualized(total_return, len(daily)),
+        'volatility': deviation * np.sqrt(TRADING_DAYS),
+        'sharpe': float(daily.mean() / deviation * np.sqrt(TRADING_DAYS)) if deviation > 0 else None,
+        'max_drawdown': float(np.max(1 - values / np.maximum.accumulate(values))),
+        'turnover': traded / (len(daily) / TRADING_DAYS),
+        'holdings': holdings / len(days)
+    })
+    if panel.benchmark is not None and panel.benchmark[first] > 0:
+        result['benchmark_return'] = _annualized(panel.benchmark[-1] / panel.benchmark[first] - 1, len(daily))
+        if result['annual_return'] is not None and result['benchmark_return'] is not None:
+            result['excess_return'] = result['annual_return'] - result['benchmark_return']
+    return result
+
+
+def _init_worker(panel):
+    global _worker_panel
+    _worker_panel = panel
+
+
+def _simulate_in_worker(config):
+    return simulate(_worker_panel, config)
+
+
+def run_backtests(panel, configs, workers=None):
+    """simulate every config, fanned out over workers processes (all cores by default)
+
+    The panel is sent to each worker once, when it starts. Workers are
+    spawned rather than forked, like the score backfill's, since the
+    fetcher's threads are already running. Results come back in the order
+    of configs.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(configs) < 2:
+        return [simulate(panel, config) for config in configs]
+    workers = min(workers, len(configs))
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=get_context('spawn'), initializer=_init_worker, initargs=(panel,)
+    ) as pool:
+        return list(pool.map(_simulate_in_worker, configs, chunksize=max(1, len(configs) // (workers * 4))))
+
+
+def save_run(run, results_dir=RESULTS_DIR):
+    os.makedirs(results_dir, exist_ok=True)
+    stamp = run['started_at'].replace(':', '').replace('-', '')
+    path = os.path.join(results_dir, f"backtest-{stamp}.json")
+    with open(path, 'w') as f:
+        json.dump(run, f, indent=2)
+    return path
+
+
+def print_report(results, limit=None):
+    """Configurations ranked by Sharpe ratio, those that never started last"""
+    def pct(value):
+        return '-' if value is None else f"{value * 100:.1f}%"
+
+    ranked = sorted(results, key=lambda r: (r['sharpe'] is None, -(r['sharpe'] or 0)))
+    print(f"{'top':>5}{'rebal':>6}{'min':>6}{'weight':>8}{'bps':>5}  {'annual':>8}{'bench':>8}{'excess':>8}"
+          f"{'vol':>8}{'sharpe':>8}{'max dd':>8}{'turnover':>10}")
+    for r in ranked[:limit]:
+        sharpe = '-' if r['sharpe'] is None else f"{r['sharpe']:.2f}"
+        turnover = '-' if r['turnover'] is None else f"{r['turnover']:.2f}x"
+        print(f"{r['top_n']:>5}{r['rebalance']:>6}{r['min_score']:>6g}{r['weighting']:>8}{r['cost_bps']:>5g}  "
+              f"{pct(r['annual_return']):>8}{pct(r['benchmark_return']):>8}{pct(r['excess_return']):>8}"
+              f"{pct(r['volatility']):>8}{sharpe:>8}{pct(r['max_drawdown']):>8}{turnover:>10}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backtest holding the top Mercato-scored stocks")
+    parser.add_argument('--tickers', nargs='+', help="universe to pick from (default: the S&P 500)")
+    parser.add_argument('--period', default=BACKTEST_PERIOD, help="history to simulate, e.g. 3y or 5y")
+    parser.add_argument('--top', type=int, nargs='+', default=DEFAULT_GRID['top_n'])
+    parser.add_argument('--rebalance', nargs='+', choices=list(REBALANCE_FREQUENCIES), default=DEFAULT_GRID['rebalance'])
+    parser.add_argument('--min-score', type=float, nargs='+', default=DEFAULT_GRID['min_score'])
+    parser.add_argument('--weighting', nargs='+', choices=WEIGHTINGS, default=DEFAULT_GRID['weighting'])
+    parser.add_argument('--cost-bps', type=float, nargs='+', default=DEFAULT_GRID['cost_bps'])
+    parser.add_argument('--lag', type=int, nargs='+', default=[DEFAULT_CONFIG['lag']])
+    parser.add_argument('--workers', type=int, default=None, help="processes to score and simulate with (default: all cores)")
+    parser.add_argument('--limit', type=int, default=20, help="rows of the report to print")
+    parser.add_argument('--no-save', action='store_true')
+    args = parser.parse_args(argv)
+
+    tickers = args.tickers
+    if not tickers:
+        from mercato_leaderboard import load_sp500_constituents
+        tickers = list(load_sp500_constituents()['ticker'])
+
+    started_at = datetime.now(timezone.utc).isoformat(timespec='seconds')
+    start = time.time()
+    panel = load_panel(tickers, args.period, workers=args.workers)
+    print(f"Loaded {len(panel.tickers)} tickers x {len(panel)} days in {time.time() - start:.1f}s", file=sys.stderr)
+
+    configs = parameter_grid({
+        'top_n': args.top,
+        'rebalance': args.rebalance,
+        'min_score': args.min_score,
+        'weighting': args.weighting,
+        'cost_bps': args.cost_bps,
+        'lag': args.lag
+    })
+    start = time.time()
+    results = run_backtests(panel, configs, args.workers)
+    print(f"Ran {len(configs)} configurations in {time.time() - start:.1f}s", file=sys.stderr)
+
+    print_report(results, args.limit)
+    if not args.no_save:
+        run = {'started_at': started_at, 'period': args.period, 'universe': panel.tickers, 'results': results}
+        print(f"Saved {save_run(run)}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""
+Mercato benchmarks
+Times each stage of the scoring pipeline on synthetic portfolios of growing
+size, with no network access, and saves the results so runs can be compared
+
+    python mercato_bench.py                       # 10 / 100 / 500 / 5000 tickers
+    python mercato_bench.py --sizes 100 500 --repeat 5 --latency 0.2
+"""
+
+import argparse
+import atexit
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import zlib
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+RESULTS_DIR = os.path.join(os.environ.get('MERCATO_DATA_DIR', '.mercato'), 'bench')
+
+# Benchmarks get their own scratch stores so they never touch real data
+os.environ['MERCATO_DATA_DIR'] = tempfile.mkdtemp(prefix='mercato-bench-')
+atexit.register(shutil.rmtree, os.environ['MERCATO_DATA_DIR'], ignore_errors=True)
+
+from mercato_data import prefetch_stock_data  # noqa: E402
+from mercato_fetch import Fetcher, set_fetcher  # noqa: E402
+from mercato_providers import MarketDataProvider, set_provider  # noqa: E402
+from mercato_scoring import calculate_portfolio_score, generate_insights, score_stock, score_stocks  # noqa: E402
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mercato_app.py')
+DEFAULT_SIZES = [10, 100, 500, 5000]
+STAGES = ['fetch_cold', 'fetch_warm', 'score_stock', 'score_stocks', 'portfolio_score', 'insights', 'dashboard']
+SECTORS = ['Technology', 'Healthcare', 'Financial Services', 'Energy', 'Industrials', 'Utilities']
+TRADING_DAYS = 252
+
+
+class SyntheticProvider(MarketDataProvider):
+    """Deterministic random-walk prices and plausible fundamentals for any ticker
+
+    Each ticker's data is seeded from its name, so every run sees the same
+    market. latency seconds are slept per request to mimic Yahoo.
+    """
+
+    def __init__(self, latency=0.0, end=None):
+        self.latency = latency
+        end = end or pd.Timestamp.today().normalize()
+        self.index = pd.bdate_range(end=end, periods=TRADING_DAYS * 2, tz='America/New_York', name='Date')
+
+    def _rng(self, ticker, salt=''):
+        return np.random.default_rng(zlib.crc32(f"{ticker}{salt}".encode()))
+
+    def _full_history(self, ticker):
+        rng = self._rng(ticker)
+        n = len(self.index)
+        close = 100 * np.exp(np.cumsum(rng.normal(0.0003, rng.uniform(0.01, 0.03), n)))
+        spread = np.abs(rng.normal(0, 0.01, n))
+        return pd.DataFrame({
+            'Open': close * (1 + rng.normal(0, 0.005, n)),
+            'High': close * (1 + spread),
+            'Low': close * (1 - spread),
+            'Close': close,
+            'Volume': rng.integers(100_000, 10_000_000, n).astype(float),
+            'Dividends': 0.0,
+            'Stock Splits': 0.0
+        }, index=self.index)
+
+    def _slice(self, hist, period, start):
+        if start is not None:
+            return hist[hist.index.strftime('%Y-%m-%d') >= pd.Timestamp(start).strftime('%Y-%m-%d')]
+        days = {'5d': 5, '1mo': 21, '3mo': 63, '6mo': 126, '1y': TRADING_DAYS}.get(period, len(hist))
+        return hist.iloc[-days:]
+
+    def history(self, ticker, period='1y', interval='1d', start=None):
+        if self.latency:
+            time.sleep(self.latency)
+        return self._slice(self._full_history(ticker), period, start)
+
+    def histories(self, tickers, period='1y', start=None):
+        if self.latency:
+            time.sleep(self.latency)
+        return {ticker: self._slice(self._full_history(ticker), period, start) for ticker in dict.fromkeys(tickers)}
+
+    def info(self, ticker):
+        if self.latency:
+            time.sleep(self.latency)
+        rng = self._rng(ticker, 'info')
+        market_cap = float(rng.uniform(2e9, 2e12))
+        low = float(rng.uniform(50, 100))
+        return {
+            'longName': f"{ticker} Corporation",
+            'website': f"https://www.{ticker.lower()}.com",
+            'sector': SECTORS[int(rng.integers(len(SECTORS)))],
+            'totalDebt': market_cap * rng.uniform(0, 1),
+            'totalCash': market_cap * rng.uniform(0, 0.2),
+            'freeCashflow': market_cap * rng.uniform(-0.02, 0.08),
+            'marketCap': market_cap,
+            'profitMargins': rng.uniform(-0.1, 0.4),
+            'operatingMargins': rng.uniform(-0.1, 0.45),
+            'returnOnEquity': rng.uniform(-0.1, 0.4),
+            'revenueGrowth': rng.uniform(-0.1, 0.3),
+            'earningsGrowth': rng.uniform(-0.2, 0.4),
+            'beta': rng.uniform(0.4, 2.0),
+            'fiftyTwoWeekHigh': low * rng.uniform(1.1, 2.0),
+            'fiftyTwoWeekLow': low
+        }
+
+
+def synthetic_tickers(size):
+    return [f"S{i:04d}" for i in range(size)]
+
+
+def _dashboard(stock_scores):
+    """Run the dashboard screen once in Streamlit's headless test runner"""
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(APP_PATH, default_timeout=600)
+    app.session_state['screen'] = 'dashboard'
+    app.session_state['portfolio'] = [s['ticker'] for s in stock_scores]
+    app.session_state['stock_scores'] = stock_scores
+    app.session_state['shares'] = {s['ticker']: 10.0 for s in stock_scores}
+    app.session_state['selected_stock'] = None
+    app.run()
+    if app.exception:
+        raise RuntimeError(app.exception[0].value)
+
+
+def measure(fn, repeat):
+    """Best wall time over repeat runs, then peak traced memory of one more run"""
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return result, {'seconds': min(times), 'mean_seconds': float(np.mean(times)), 'peak_mb': peak / 1e6}
+
+
+def run_size(size, stages, repeat, dashboard_max):
+    """Run the selected stages for one universe size"""
+    tickers = synthetic_tickers(size)
+    results = {}
+
+    # The first prefetch fills the empty stores, later ones are served from them
+    start = time.perf_counter()
+    stock_data = prefetch_stock_data(tickers)
+    if 'fetch_cold' in stages:
+        results['fetch_cold'] = {'seconds': time.perf_counter() - start}
+    if 'fetch_warm' in stages:
+        stock_data, results['fetch_warm'] = measure(lambda: prefetch_stock_data(tickers), repeat)
+
+    stock_scores = score_stocks(stock_data)
+    if 'score_stock' in stages:
+        _, results['score_stock'] = measure(lambda: [score_stock(t, d) for t, d in stock_data.items()], repeat)
+    if 'score_stocks' in stages:
+        stock_scores, results['score_stocks'] = measure(lambda: score_stocks(stock_data), repeat)
+    if 'portfolio_score' in stages:
+        _, results['portfolio_score'] = measure(lambda: calculate_portfolio_score(stock_scores), repeat)
+    if 'insights' in stages:
+        _, results['insights'] = measure(lambda: generate_insights(stock_scores), repeat)
+    if 'dashboard' in stages and size <= dashboard_max:
+        _, results['dashboard'] = measure(lambda: _dashboard(stock_scores), 1)
+
+    for stage in results.values():
+        stage['ms_per_ticker'] = stage['seconds'] * 1000 / size
+    return results
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(APP_PATH)
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def load_previous(results_dir=RESULTS_DIR):
+    """The most recent saved run, or None"""
+    if not os.path.isdir(results_dir):
+        return None
+    runs = sorted(f for f in os.listdir(results_dir) if f.endswith('.json'))
+    if not runs:
+        return None
+    with open(os.path.join(results_dir, runs[-1])) as f:
+        return json.load(f)
+
+
+def save_run(run, results_dir=RESULTS_DIR):
+    os.makedirs(results_dir, exist_ok=True)
+    stamp = run['started_at'].replace(':', '').replace('-', '')
+    path = os.path.join(results_dir, f"bench-{stamp}-{run['revision'] or 'unknown'}.json")
+    with open(path, 'w') as f:
+        json.dump(run, f, indent=2)
+    return path
+
+
+def print_report(run, previous=None):
+    print(f"{'size':>6}  {'stage':<16}{'seconds':>10}{'ms/ticker':>11}{'peak MB':>10}{'vs prev':>9}")
+    for size, stages in run['results'].items():
+        for stage, stats in stages.items():
+            change = ''
+            prev = (previous or {}).get('results', {}).get(size, {}).get(stage)
+            if prev and prev['seconds'] > 0:
+                change = f"{(stats['seconds'] / prev['seconds'] - 1) * 100:+.0f}%"
+            peak = f"{stats['peak_mb']:.1f}" if 'peak_mb' in stats else '-'
+            print(f"{size:>6}  {stage:<16}{stats['seconds']:>10.4f}{stats['ms_per_ticker']:>11.3f}{peak:>10}{change:>9}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Mercato scoring pipeline on synthetic data")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--latency', type=float, default=0.0, help="simulated seconds per provider request")
+    parser.add_argument('--rate', type=float, default=None, help="provider requests per second (default: unlimited)")
+    parser.add_argument('--dashboard-max', type=int, default=500, help="largest size to render the dashboard for")
+    parser.add_argument('--no-save', action='store_true')
+    args = parser.parse_args(argv)
+
+    set_provider(SyntheticProvider(latency=args.latency))
+    # Synthetic data has no rate limit to respect, unless one is asked for
+    if args.rate:
+        set_fetcher(Fetcher(rate=args.rate, burst=max(1, int(args.rate))))
+    else:
+        set_fetcher(Fetcher(rate=1e9, burst=10 ** 6))
+    run = {
+        'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'revision': _git_revision(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'latency': args.latency,
+        'rate': args.rate,
+        'repeat': args.repeat,
+        'results': {}
+    }
+    for size in args.sizes:
+        print(f"Benchmarking {size} tickers...", file=sys.stderr)
+        run['results'][str(size)] = run_size(size, args.stages, args.repeat, args.dashboard_max)
+
+    previous = load_previous()
+    print_report(run, previous)
+    if not args.no_save:
+        print(f"Saved {save_run(run)}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,726 @@
+"""
+Mercato market data layer
+Batched price history and concurrent fundamentals fetching for the scorers,
+backed by the local price and fundamentals stores in mercato_store
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from concurrent.futures import wait as futures_wait
+
+import numpy as np
+import pandas as pd
+
+from mercato_fetch import FlightCancelled, get_fetcher
+from mercato_metrics import count_cache, incr
+from mercato_providers import get_provider, period_start
+from mercato_store import FundamentalsStore, PriceStore
+
+log = logging.getLogger(__name__)
+
+HISTORY_PERIOD = "1y"
+MAX_INFO_WORKERS = 8
+
+# A batched download covers many tickers, so it gets longer than one request
+BATCH_TIMEOUT = 120
+
+# Stored prices younger than this are served without asking Yahoo for new bars
+PRICE_REFRESH_TTL = 5 * 60
+
+# Fundamentals only move quarterly, so they are refetched daily or right
+# after an earnings release, whichever comes first
+FUNDAMENTALS_TTL = 24 * 60 * 60
+FUNDAMENTAL_FIELDS = [
+    'longName', 'shortName', 'website', 'sector',
+    'totalDebt', 'totalCash', 'freeCashflow', 'marketCap',
+    'profitMargins', 'operatingMargins', 'returnOnEquity',
+    'revenueGrowth', 'earningsGrowth', 'beta',
+    'fiftyTwoWeekHigh', 'fiftyTwoWeekLow', 'earningsTimestamp'
+]
+
+# Momentum is scored relative to a benchmark: 'market' compares every stock
+# with DEFAULT_BENCHMARK, 'sector' with the ETF for the stock's sector
+BENCHMARK_MODE = 'market'
+DEFAULT_BENCHMARK = 'SPY'
+BENCHMARK_TTL = 15 * 60
+SECTOR_BENCHMARKS = {
+    'Technology': 'XLK',
+    'Healthcare': 'XLV',
+    'Financial Services': 'XLF',
+    'Consumer Cyclical': 'XLY',
+    'Consumer Defensive': 'XLP',
+    'Energy': 'XLE',
+    'Industrials': 'XLI',
+    'Basic Materials': 'XLB',
+    'Utilities': 'XLU',
+    'Real Estate': 'XLRE',
+    'Communication Services': 'XLC'
+}
+
+
+class TTLCache:
+    """Thread-safe in-process cache whose entries expire after ttl seconds
+
+    A named cache counts its hits and misses in the process metrics.
+    """
+
+    def __init__(self, ttl, name=None):
+        self.ttl = ttl
+        self.name = name
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def _count(self, hit):
+        if self.name:
+            count_cache(self.name, hits=int(hit), misses=int(not hit))
+
+    def get(self, key):
+        value = self._lookup(key)
+        self._count(value is not None)
+        return value
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, stored_at = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+
+    def get_or_load(self, key, loader):
+        """Return the cached value, calling loader() once on a miss
+
+        Concurrent misses for the same key wait for the first load instead of
+        all calling loader(). None results are not cached.
+        """
+        value = self._lookup(key)
+        if value is not None:
+            self._count(True)
+            return value
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            value = self._lookup(key)
+            self._count(value is not None)
+            if value is None:
+                value = loader()
+                if value is not None:
+                    self.set(key, value)
+            return value
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+
+class CompactHistory:
+    """One ticker's daily bars as flat read-only numpy arrays
+
+    Dates are int64 nanoseconds since the epoch and prices and volume are
+    float32, a few KB per year of bars. Indexing by column ('Close', 'Open',
+    ...) gives a float64 Series on the exchange-timezone date index, like
+    the Ticker.history() frames it replaces, and frame() rebuilds the full
+    DataFrame for charting.
+    """
+
+    COLUMNS = {'Open': 'open', 'High': 'high', 'Low': 'low', 'Close': 'close', 'Volume': 'volume'}
+    __slots__ = ('ticker', 'tz', 'dates', 'open', 'high', 'low', 'close', 'volume')
+
+    def __init__(self, ticker, dates, open, high, low, close, volume, tz=None):
+        self.ticker = ticker
+        self.tz = tz
+        self.dates = np.asarray(dates, dtype=np.int64)
+        for name, values in zip(['open', 'high', 'low', 'close', 'volume'], [open, high, low, close, volume]):
+            array = np.asarray(values, dtype=np.float32)
+            array.flags.writeable = False
+            setattr(self, name, array)
+        self.dates.flags.writeable = False
+
+    @classmethod
+    def from_frame(cls, ticker, hist):
+        """Compact a Ticker.history()-shaped DataFrame"""
+        index = hist.index
+        tz = str(index.tz) if index.tz is not None else None
+        dates = (index.tz_localize(None) if tz else index).normalize().asi8
+        return cls(ticker, dates, *(hist[col].to_numpy() for col in cls.COLUMNS), tz=tz)
+
+    def __len__(self):
+        return len(self.dates)
+
+    @property
+    def empty(self):
+        return len(self.dates) == 0
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in ['dates', *self.COLUMNS.values()])
+
+    @property
+    def index(self):
+        index = pd.DatetimeIndex(self.dates, name='Date')
+        return index.tz_localize(self.tz) if self.tz else index
+
+    def __getitem__(self, column):
+        return pd.Series(getattr(self, self.COLUMNS[column]).astype(float), index=self.index, name=column)
+
+    def same_bars(self, other):
+        """Whether other holds the same dates and closes"""
+        return (
+            other is not None
+            and np.array_equal(self.dates, other.dates)
+            and np.array_equal(self.close, other.close)
+        )
+
+    def frame(self, start=None):
+        """The bars as a float64 DataFrame, from start onwards if given"""
+        hist = pd.DataFrame({col: self[col] for col in self.COLUMNS})
+        if start is not None:
+            hist = hist[hist.index.strftime('%Y-%m-%d') >= pd.Timestamp(start).strftime('%Y-%m-%d')]
+        return hist
+
+
+_benchmark_cache = TTLCache(BENCHMARK_TTL, name='benchmark')
+
+# One CompactHistory per (ticker, period), shared by every session in the
+# process and rebuilt only after the price store refreshes that ticker
+_shared_histories = {}
+_shared_histories_lock = threading.Lock()
+
+# Last/previous close shown next to each holding while editing the portfolio
+QUOTE_TTL = 60
+_quote_cache = TTLCache(QUOTE_TTL, name='quotes')
+
+# Chart bars by interval; finer bars go stale sooner
+CHART_TTLS = {'5m': 60, '15m': 5 * 60, '1h': 15 * 60, '1d': 60 * 60}
+_chart_caches = {interval: TTLCache(ttl, name=f'chart_{interval}') for interval, ttl in CHART_TTLS.items()}
+
+
+def build_stock_data(ticker, info, hist):
+    """Turn a stock's info dict and price history into the dict the scorers use
+
+    hist may be a CompactHistory or a Ticker.history() DataFrame, which is
+    compacted.
+    """
+    if hist is None or hist.empty:
+        return None
+    if isinstance(hist, pd.DataFrame):
+        hist = CompactHistory.from_frame(ticker, hist)
+
+    info = info or {}
+    company_name = info.get('longName', info.get('shortName', ticker))
+    logo_url = f"https://logo.clearbit.com/{info.get('website', '').replace('https://', '').replace('http://', '').split('/')[0]}"
+
+    return {
+        'ticker': ticker,
+        'company_name': company_name,
+        'logo_url': logo_url,
+        'sector': info.get('sector', 'Unknown'),
+        'price': float(hist.close[-1]),
+        'prev_close': float(hist.close[-2] if len(hist) >= 2 else hist.close[-1]),
+        'total_debt': info.get('totalDebt', 0),
+        'total_cash': info.get('totalCash', 0),
+        'free_cash_flow': info.get('freeCashflow', 0),
+        'market_cap': info.get('marketCap', 1),
+        'profit_margin': info.get('profitMargins', 0),
+        'operating_margin': info.get('operatingMargins', 0),
+        'roe': info.get('returnOnEquity', 0),
+        'revenue_growth': info.get('revenueGrowth', 0),
+        'earnings_growth': info.get('earningsGrowth', 0),
+        'beta': info.get('beta', 1),
+        'fifty_two_week_high': info.get('fiftyTwoWeekHigh', 0),
+        'fifty_two_week_low': info.get('fiftyTwoWeekLow', 0),
+        'hist': hist
+    }
+
+
+def get_stock_data(ticker):
+    """Get financial data for a stock, or None if it can't be fetched"""
+    try:
+        info = load_fundamentals([ticker]).get(ticker, {})
+        hist = load_price_histories([ticker]).get(ticker)
+        return build_stock_data(ticker, info, hist)
+    except Exception as e:
+        log.warning("Error fetching %s: %s: %s", ticker, type(e).__name__, e)
+        return None
+
+
+def fetch_price_histories(tickers, period=HISTORY_PERIOD, start=None):
+    """Download price history for many tickers in a single request"""
+    tickers = list(dict.fromkeys(tickers))
+    if not tickers:
+        return {}
+    return get_fetcher().call(get_provider().histories, tickers, period=period, start=start, timeout=BATCH_TIMEOUT)
+
+
+_price_store = None
+_fundamentals_store = None
+_store_lock = threading.Lock()
+
+
+def get_price_store():
+    """The process-wide local price store, opened on first use"""
+    global _price_store
+    with _store_lock:
+        if _price_store is None:
+            _price_store = PriceStore()
+        return _price_store
+
+
+def get_fundamentals_store():
+    """The process-wide local fundamentals store, opened on first use"""
+    global _fundamentals_store
+    with _store_lock:
+        if _fundamentals_store is None:
+            _fundamentals_store = FundamentalsStore()
+        return _fundamentals_store
+
+
+def _has_adjustments(hist):
+    return bool((hist['Dividends'] != 0).any() or (hist['Stock Splits'] != 0).any())
+
+
+def refresh_price_histories(tickers, max_age=PRICE_REFRESH_TTL):
+    """Bring the local price store up to date, downloading only missing bars
+
+    Tickers refreshed within max_age seconds are skipped, and ones another
+    caller is already downloading are waited on instead of fetched twice.
+    """
+    store = get_price_store()
+    flights = get_fetcher().flights
+    now = time.time()
+    refreshed = store.refreshed_at(tickers)
+    tickers = list(dict.fromkeys(tickers))
+    stale = [t for t in tickers if now - refreshed.get(t, 0) > max_age]
+    count_cache('prices', hits=len(tickers) - len(stale), misses=len(stale))
+    if not stale:
+        return
+
+    mine, waiting = flights.claim([('prices', t) for t in stale])
+    error = None
+    try:
+        # Someone may have finished these between our check and the claim
+        refreshed = store.refreshed_at([ticker for _, ticker in mine])
+        _download_price_histories(store, [ticker for _, ticker in mine if refreshed.get(ticker, 0) < now])
+    except BaseException as e:
+        error = e if isinstance(e, Exception) else FlightCancelled()
+        raise
+    finally:
+        for key in mine:
+            flights.release(key, error=error)
+    # Their bars land in the store, so only wait for them, not their outcome
+    futures_wait(waiting.values())
+
+
+def _download_price_histories(store, stale):
+    """Download and store bars for stale tickers
+
+    New tickers get a full HISTORY_PERIOD download; known ones only fetch
+    from their last stored date, which is re-fetched because it may have
+    been a partial session. If the new bars carry a split or dividend, the
+    adjusted history has shifted and the ticker is downloaded again from its
+    first stored date, so histories extended past HISTORY_PERIOD keep their length.
+    """
+    if not stale:
+        return
+    last_dates = store.last_dates(stale)
+    new = [t for t in stale if t not in last_dates]
+    known = [t for t in stale if t in last_dates]
+    readjusted = []
+
+    if known:
+        updates = fetch_price_histories(known, start=min(last_dates.values()).strftime('%Y-%m-%d'))
+        for ticker in known:
+            hist = updates.get(ticker)
+            if hist is None:
+                continue
+            last = last_dates[ticker].strftime('%Y-%m-%d')
+            dates = hist.index.strftime('%Y-%m-%d')
+            if _has_adjustments(hist[dates > last]):
+                readjusted.append(ticker)
+            elif (dates >= last).any():
+                store.write(ticker, hist[dates >= last])
+            else:
+                store.touch(ticker)
+
+    if new:
+        for ticker, hist in fetch_price_histories(new).items():
+            store.write(ticker, hist)
+    if readjusted:
+        # Tickers stored over the same span share one download
+        by_start = {}
+        for ticker, first in store.first_dates(readjusted).items():
+            by_start.setdefault(first.strftime('%Y-%m-%d'), []).append(ticker)
+        for start, group in sorted(by_start.items()):
+            for ticker, hist in fetch_price_histories(group, start=start).items():
+                store.write(ticker, hist, replace=True)
+
+
+def extend_price_histories(tickers, period, grace_days=7):
+    """Make sure the local store holds period of bars for tickers, not just HISTORY_PERIOD
+
+    Stores are first brought up to date, then tickers whose earliest bar
+    starts more than grace_days after the period's start are downloaded in
+    full for period, replacing what was stored. A ticker listed after that
+    start is requested again on every call, since it can't reach back further.
+    """
+    tickers = list(dict.fromkeys(tickers))
+    refresh_price_histories(tickers)
+    store = get_price_store()
+    first_dates = store.first_dates(tickers)
+    cutoff = period_start(period) + pd.Timedelta(days=grace_days)
+    short = [t for t in tickers if t not in first_dates or first_dates[t] > cutoff]
+    if short:
+        for ticker, hist in fetch_price_histories(short, period=period).items():
+            if hist is not None and not hist.empty:
+                store.write(ticker, hist, replace=True)
+
+
+def read_price_history(ticker, period=HISTORY_PERIOD):
+    """Stored daily bars for the trailing period, without any network call"""
+    return get_price_store().read(ticker, start=period_start(period))
+
+
+def get_quotes(tickers):
+    """Last and previous close per ticker, fetched in one batch per QUOTE_TTL
+
+    Tickers without two recent bars map to an empty dict, which is cached
+    too so they aren't re-requested on every rerun.
+    """
+    tickers = list(dict.fromkeys(tickers))
+    quotes = {ticker: _quote_cache.get(ticker) for ticker in tickers}
+    missing = [ticker for ticker, quote in quotes.items() if quote is None]
+    if missing:
+        histories = fetch_price_histories(missing, period='5d')
+        for ticker in missing:
+            hist = histories.get(ticker)
+            quote = {}
+            if hist is not None and len(hist) >= 2:
+                quote = {'price': hist['Close'].iloc[-1], 'prev_close': hist['Close'].iloc[-2]}
+            _quote_cache.set(ticker, quote)
+            quotes[ticker] = quote
+    return quotes
+
+
+def get_chart_history(ticker, period, interval, daily_hist=None):
+    """Bars for a price chart, cached per (ticker, period, interval)
+
+    Daily views are cut from daily_hist (the history the stock was scored
+    with) when given, otherwise from the local price store, so only
+    intraday views ever reach the provider.
+    """
+    if interval == '1d' and daily_hist is not None and not daily_hist.empty:
+        return daily_hist.frame(start=period_start(period))
+
+    def load():
+        if interval == '1d':
+            return read_price_history(ticker, period)
+        return get_fetcher().call(get_provider().history, ticker, period=period, interval=interval)
+
+    cache = _chart_caches.get(interval)
+    if cache is None:
+        return load()
+    return cache.get_or_load((ticker, period), load)
+
+
+def _price_refresh_failed(tickers, error):
+    """Log and count a price refresh that failed, before falling back to the stored bars"""
+    log.warning("Price refresh for %d tickers failed, serving stored bars: %s: %s",
+                len(tickers), type(error).__name__, error)
+    incr('provider_errors', call='price_refresh', kind='fallback')
+
+
+def load_price_histories(tickers, period=HISTORY_PERIOD):
+    """Refresh the local store for tickers, then read their history from it
+
+    If Yahoo can't be reached the stored bars are served as they are.
+    """
+    tickers = list(dict.fromkeys(tickers))
+    try:
+        refresh_price_histories(tickers)
+    except Exception as e:
+        _price_refresh_failed(tickers, e)
+
+    return shared_histories(tickers, period)
+
+
+def shared_histories(tickers, period=HISTORY_PERIOD):
+    """The process-wide CompactHistory of each ticker with stored bars
+
+    A ticker is only read back from the price store once it has been
+    refreshed since its entry was built, and all such reads share one
+    query. If the bars turn out unchanged the existing entry is kept, so
+    every session keeps pointing at the same arrays.
+    """
+    tickers = list(dict.fromkeys(tickers))
+    refreshed = get_price_store().refreshed_at(tickers)
+    with _shared_histories_lock:
+        entries = {t: _shared_histories.get((t, period)) for t in tickers}
+    stale = [t for t, entry in entries.items() if entry is None or entry[0] != refreshed.get(t)]
+    count_cache('histories', hits=len(tickers) - len(stale), misses=len(stale))
+
+    if stale:
+        columns = get_price_store().read_columns(stale, start=period_start(period))
+        with _shared_histories_lock:
+            for ticker in stale:
+                hist = None
+                if ticker in columns:
+                    tz, dates, bars = columns[ticker]
+                    hist = CompactHistory(ticker, dates.view(np.int64), *bars.T, tz=tz)
+                old = entries[ticker]
+                if hist is not None and old is not None and hist.same_bars(old[1]):
+                    hist = old[1]
+                entries[ticker] = (refreshed.get(ticker), hist)
+                _shared_histories[(ticker, period)] = entries[ticker]
+
+    return {t: entry[1] for t, entry in entries.items() if entry[1] is not None}
+
+
+def benchmark_for(sector=None, mode=None):
+    """Pick the benchmark ticker a stock's momentum is measured against"""
+    mode = mode or BENCHMARK_MODE
+    if mode == 'sector':
+        return SECTOR_BENCHMARKS.get(sector, DEFAULT_BENCHMARK)
+    return DEFAULT_BENCHMARK
+
+
+def _load_benchmark(symbol):
+    try:
+        hist = get_fetcher().call(get_provider().history, symbol, period=HISTORY_PERIOD)
+    except Exception as e:
+        log.warning("Benchmark %s unavailable: %s: %s", symbol, type(e).__name__, e)
+        return None
+    if hist.empty:
+        return None
+    return hist['Close']
+
+
+def get_benchmark_history(symbol=DEFAULT_BENCHMARK):
+    """Closing prices for a benchmark, downloaded once per BENCHMARK_TTL
+
+    The cache lives at module level, so every ticker and every Streamlit
+    session scored in this process shares the same download. A sector ETF
+    that can't be fetched, or fails to download, falls back to
+    DEFAULT_BENCHMARK; None if that fails too.
+    """
+    closes = _benchmark_cache.get_or_load(symbol, lambda: _load_benchmark(symbol))
+    if closes is None and symbol != DEFAULT_BENCHMARK:
+        return get_benchmark_history(DEFAULT_BENCHMARK)
+    return closes
+
+
+def cached_benchmark_history(symbol):
+    """Benchmark closes already in the cache, or None, without ever fetching"""
+    return _benchmark_cache.get(symbol)
+
+
+def warm_benchmarks(symbols):
+    """Load benchmarks into the cache ahead of scoring, logging and skipping any that fail"""
+    for symbol in symbols:
+        get_benchmark_history(symbol)
+
+
+def fetch_info(ticker):
+    """Fetch a stock's fundamentals, or an empty dict if Yahoo has none
+
+    Failed requests are retried and counted by the fetcher before giving up.
+    """
+    try:
+        return get_fetcher().call(get_provider().info, ticker, key=('info', ticker)) or {}
+    except Exception:
+        return {}
+
+
+def _fundamentals_expired(info, fetched_at, now):
+    if now - fetched_at > FUNDAMENTALS_TTL:
+        return True
+    # An earnings release since the last fetch means new quarterly numbers
+    earnings_at = info.get('earningsTimestamp')
+    return bool(earnings_at) and fetched_at < earnings_at <= now
+
+
+def _store_fundamentals(ticker, info):
+    """Keep FUNDAMENTAL_FIELDS of a fetched info dict, or None if Yahoo had none"""
+    if not info:
+        return None
+    info = {field: info[field] for field in FUNDAMENTAL_FIELDS if info.get(field) is not None}
+    get_fundamentals_store().write(ticker, info)
+    return info
+
+
+def load_fundamentals(tickers, max_workers=MAX_INFO_WORKERS):
+    """Fundamentals for tickers, served from the local store while fresh
+
+    Missing or expired entries are refetched through the fetcher, at most
+    max_workers at a time, and only FUNDAMENTAL_FIELDS are kept. If a
+    refetch comes back empty the expired entry is used rather than nothing.
+    """
+    tickers = list(dict.fromkeys(tickers))
+    stored = get_fundamentals_store().read(tickers)
+    now = time.time()
+    stale = [t for t in tickers if t not in stored or _fundamentals_expired(*stored[t], now)]
+    count_cache('fundamentals', hits=len(tickers) - len(stale), misses=len(stale))
+
+    fundamentals = {t: stored[t][0] for t in tickers if t in stored}
+    for ticker, info in get_fetcher().stream(get_provider().info, stale, concurrency=max_workers, dataset='info'):
+        info = _store_fundamentals(ticker, info)
+        if info:
+            fundamentals[ticker] = info
+    return fundamentals
+
+
+def invalidate_fundamentals(tickers=None):
+    """Force fundamentals to be refetched on next use, for tickers or for everything"""
+    get_fundamentals_store().invalidate(tickers)
+
+
+def prefetch_stock_data(tickers, max_workers=MAX_INFO_WORKERS):
+    """Fetch price history and fundamentals for a whole portfolio at once
+
+    The multi-ticker history refresh, the fundamentals lookups and the
+    benchmark downloads run side by side, so the total time follows the
+    slowest request. Tickers without price data are left out of the result.
+    """
+    tickers = list(dict.fromkeys(tickers))
+    if not tickers:
+        return {}
+
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        hist_future = pool.submit(load_price_histories, tickers)
+        info_future = pool.submit(load_fundamentals, tickers, max_workers)
+
+        # Warm the benchmark cache so momentum scoring doesn't wait on it, for
+        # the sectors already stored and then for any the fetched fundamentals add
+        stored = get_fundamentals_store().read(tickers)
+        symbols = {DEFAULT_BENCHMARK} | {benchmark_for(stored[t][0].get('sector')) for t in stored}
+        bench_future = pool.submit(warm_benchmarks, sorted(symbols))
+        histories = hist_future.result()
+        infos = info_future.result()
+        warm_benchmarks(sorted({benchmark_for(infos.get(t, {}).get('sector')) for t in tickers} - symbols))
+        bench_future.result()
+
+    stock_data = {}
+    for ticker in tickers:
+        data = build_stock_data(ticker, infos.get(ticker), histories.get(ticker))
+        if data is not None:
+            stock_data[ticker] = data
+    return stock_data
+
+
+def _refresh_prices_quietly(tickers):
+    """Refresh stale tickers in the price store, leaving stored bars as they are on failure"""
+    try:
+        refresh_price_histories(tickers, max_age=PRICE_REFRESH_TTL)
+    except Exception as e:
+        _price_refresh_failed(tickers, e)
+
+
+def _changed_stock_data(ticker, info, old_hist, new_hist, info_changed):
+    """build_stock_data for ticker if its bars or fundamentals moved, else None"""
+    hist = old_hist
+    if new_hist is not None and not new_hist.same_bars(old_hist):
+        hist = new_hist
+    if hist is old_hist and not info_changed:
+        return None
+    return build_stock_data(ticker, info, hist)
+
+
+def iter_stock_data(tickers, histories=None, max_workers=MAX_INFO_WORKERS, timeout=None, scored_at=None):
+    """Yield (ticker, data) for each ticker that needed loading, as soon as it's ready
+
+    histories maps already-scored tickers to the price history they were
+    scored with, and scored_at to the unix time they were scored. Those are
+    only refetched once their prices outlive PRICE_REFRESH_TTL or their
+    fundamentals expire, or re-read from the price store if another caller
+    refreshed it since they were scored (always, without a scored_at), and
+    data is None unless that brought new bars or new numbers. A ticker whose fundamentals
+    didn't change keeps its stored company data, and one whose bars didn't
+    change keeps the history it was scored with. Tickers not in histories
+    are loaded in full, with data None if they have no prices.
+
+    Bars come from one batched refresh and fundamentals from one request per
+    ticker through the fetcher, so a slow ticker only holds up itself. After
+    timeout seconds the generator stops, and tickers still loading are
+    never yielded.
+    """
+    tickers = list(dict.fromkeys(tickers))
+    histories = histories or {}
+    now = time.time()
+    refreshed = get_price_store().refreshed_at(tickers)
+    stored = get_fundamentals_store().read(tickers)
+
+    scored_at = scored_at or {}
+    new = [t for t in tickers if t not in histories]
+    price_stale = new + [t for t in tickers if t in histories and now - refreshed.get(t, 0) > PRICE_REFRESH_TTL]
+    store_newer = [t for t in tickers if t in histories and refreshed.get(t, 0) > scored_at.get(t, 0)]
+    info_stale = [t for t in tickers if t not in stored or _fundamentals_expired(*stored[t], now)]
+    pending = list(dict.fromkeys(price_stale + store_newer + info_stale))
+    if not pending:
+        return
+
+    new, price_stale, info_stale = set(new), set(price_stale), set(info_stale)
+    reread = price_stale | set(store_newer)
+    infos = {t: stored[t][0] for t in pending if t in stored}
+    deadline = None if timeout is None else time.monotonic() + timeout
+    pool = ThreadPoolExecutor(max_workers=2)
+    refetched = None
+    try:
+        prices = pool.submit(_refresh_prices_quietly, sorted(price_stale))
+
+        # Warm the benchmark cache so momentum scoring doesn't wait on it
+        symbols = set(benchmark_for(infos.get(t, {}).get('sector')) for t in pending)
+        pool.submit(warm_benchmarks, symbols)
+
+        # Fundamentals keep arriving in the background while the bars are stored
+        refetched = get_fetcher().stream(
+            get_provider().info, [t for t in pending if t in info_stale],
+            concurrency=max_workers, timeout=timeout, dataset='info'
+        )
+        prices.result(timeout=None if deadline is None else max(0, deadline - time.monotonic()))
+        fresh = shared_histories(sorted(reread))
+
+        for ticker in pending:
+            if ticker not in info_stale:
+                yield ticker, _changed_stock_data(
+                    ticker, infos.get(ticker), histories.get(ticker), fresh.get(ticker), ticker in new
+                )
+        for ticker, info in refetched:
+            info = _store_fundamentals(ticker, info)
+            info_changed = ticker in new or (bool(info) and info != infos.get(ticker))
+            if info:
+                infos[ticker] = info
+            yield ticker, _changed_stock_data(
+                ticker, infos.get(ticker), histories.get(ticker), fresh.get(ticker), info_changed
+            )
+    except FuturesTimeoutError:
+        return
+    finally:
+        if refetched is not None:
+            refetched.close()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def refresh_stock_data(tickers, histories=None, max_workers=MAX_INFO_WORKERS, scored_at=None):
+    """Stock data for just the tickers whose inputs changed since they were scored
+
+    See iter_stock_data, which this collects.
+    """
+    return {
+        ticker: data
+        for ticker, data in iter_stock_data(tickers, histories, max_workers, scored_at=scored_at)
+        if data is not None
+    }
@@ -0,0 +1,377 @@
+"""
+Mercato fetch layer
+Every request to the market data provider goes through one process-wide
+Fetcher, which caps concurrency, rate-limits with a token bucket, times out
+slow requests and retries failures with jittered exponential backoff, so
+bulk jobs run at a steady pace instead of getting throttled by Yahoo.
+Concurrent requests for the same (dataset, ticker) key share one in-flight
+fetch, so sessions refreshing at the same moment don't repeat each other
+
+Tune it with:
+    MERCATO_FETCH_CONCURRENCY   requests in flight across the process (default 8)
+    MERCATO_FETCH_RATE          requests per second across the process (default 10)
+    MERCATO_FETCH_BURST         requests allowed back to back before the rate applies (default 20)
+    MERCATO_FETCH_RETRIES       retries after a failed request (default 3)
+    MERCATO_FETCH_TIMEOUT       seconds before a single request is abandoned (default 20)
+"""
+
+import asyncio
+import functools
+import os
+import queue
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from mercato_metrics import incr, observe
+
+CONCURRENCY = int(os.environ.get('MERCATO_FETCH_CONCURRENCY', 8))
+RATE = float(os.environ.get('MERCATO_FETCH_RATE', 10))
+BURST = int(os.environ.get('MERCATO_FETCH_BURST', 20))
+RETRIES = int(os.environ.get('MERCATO_FETCH_RETRIES', 3))
+TIMEOUT = float(os.environ.get('MERCATO_FETCH_TIMEOUT', 20))
+BACKOFF = 0.5
+MAX_BACKOFF = 16.0
+
+
+def is_throttle(exc):
+    """Whether an exception is Yahoo telling us to slow down"""
+    text = f"{type(exc).__name__} {exc}".lower()
+    return '429' in text or 'too many requests' in text or 'ratelimit' in text or 'rate limit' in text
+
+
+class TokenBucket:
+    """Thread-safe token bucket allowing rate requests per second, burst at once
+
+    Callers reserve a token and are told how long to wait before using it,
+    so waiting callers queue up in order instead of polling.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self):
+        """Take a token, returning the seconds to wait before it may be used"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def pause(self, seconds):
+        """Hold every caller back for at least seconds, e.g. after a throttle"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self._tokens, 0) - seconds * self.rate
+
+
+def describe_call(fn, args):
+    """The provider method a call runs and the ticker it is for, if it is for one"""
+    while isinstance(fn, functools.partial):
+        args = fn.args + tuple(args)
+        fn = fn.func
+    ticker = args[0] if args and isinstance(args[0], str) else None
+    return getattr(fn, '__name__', 'call'), ticker
+
+
+class FetchStats:
+    """Process-wide request counters
+
+    rate_limited counts requests our own token bucket delayed, throttled
+    the ones Yahoo rejected for going too fast. deduplicated counts keyed
+    calls that waited on another caller's fetch instead of making their own.
+    """
+
+    FIELDS = ['requests', 'succeeded', 'failed', 'retries', 'timeouts', 'throttled', 'rate_limited', 'deduplicated']
+
+    def __init__(self):
+        self._counts = dict.fromkeys(self.FIELDS, 0)
+        self._lock = threading.Lock()
+        self.last_error = None
+
+    def incr(self, field, n=1):
+        with self._lock:
+            self._counts[field] += n
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counts)
+
+
+class FlightCancelled(Exception):
+    """The caller fetching a key gave up before finishing, so waiters should fetch it themselves"""
+
+
+class SingleFlight:
+    """Coalesces concurrent fetches of the same key into one
+
+    The first caller to claim a key fetches it and publishes the result or
+    error; anyone claiming it meanwhile gets a Future for that result
+    instead. Keys are released as soon as they finish, so this only shares
+    in-flight work and never caches.
+    """
+
+    def __init__(self, stats=None):
+        self.stats = stats or FetchStats()
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def claim(self, keys, count=True):
+        """Split keys into (ones this caller must fetch and release, {key: Future} already in flight)
+
+        Keys found in flight are counted as deduplicated unless count is
+        False, for a caller claiming again after a flight it waited on was cancelled.
+        """
+        mine, waiting = [], {}
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                flight = self._flights.get(key)
+                if flight is None:
+                    self._flights[key] = Future()
+                    mine.append(key)
+                else:
+                    waiting[key] = flight
+        if waiting and count:
+            self.stats.incr('deduplicated', len(waiting))
+        return mine, waiting
+
+    def release(self, key, result=None, error=None):
+        """Publish the outcome of a claimed key to everyone waiting on it"""
+        with self._lock:
+            flight = self._flights.pop(key)
+        if error is not None:
+            flight.set_exception(error)
+        else:
+            flight.set_result(result)
+
+
+class FetchStream:
+    """(key, result) pairs from Fetcher.stream, in the order they finish
+
+    result is None for keys that failed every retry. Iteration stops after
+    timeout seconds, and closing the stream cancels whatever hasn't finished.
+    """
+
+    def __init__(self, results, count, task, timeout=None):
+        self._results = results
+        self._remaining = count
+        self._task = task
+        self._deadline = None if timeout is None else time.monotonic() + timeout
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._remaining <= 0:
+            raise StopIteration
+        wait = None if self._deadline is None else max(0, self._deadline - time.monotonic())
+        try:
+            item = self._results.get(timeout=wait)
+        except queue.Empty:
+            self.close()
+            raise StopIteration
+        self._remaining -= 1
+        return item
+
+    def close(self):
+        self._remaining = 0
+        if self._task is not None:
+            self._task.cancel()
+
+
+class Fetcher:
+    """Runs blocking provider calls on asyncio with limits, timeouts and retries
+
+    Every call runs on one long-lived event loop in a background thread,
+    with the blocking work in a shared thread pool. A call that times out
+    is abandoned rather than joined, so a hung provider request costs its
+    caller timeout seconds and no more. At most concurrency calls run at
+    once across the process, whether they come from call or stream.
+    """
+
+    def __init__(self, concurrency=CONCURRENCY, rate=RATE, burst=BURST, retries=RETRIES, timeout=TIMEOUT,
+                 backoff=BACKOFF, max_backoff=MAX_BACKOFF):
+        self.concurrency = concurrency
+        self.limiter = TokenBucket(rate, burst)
+        self.retries = retries
+        self.timeout = timeout
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.stats = FetchStats()
+        self.flights = SingleFlight(self.stats)
+        self._loop = None
+        self._loop_pid = None
+        self._loop_lock = threading.Lock()
+
+    def _start(self):
+        """The fetcher's event loop, started on first use (and again in a forked child)"""
+        with self._loop_lock:
+            if self._loop is None or self._loop_pid != os.getpid():
+                loop = asyncio.new_event_loop()
+                # Spare threads beyond the concurrency cap stand in for abandoned, still-hung calls
+                self._executor = ThreadPoolExecutor(self.concurrency * 4, thread_name_prefix='mercato-fetch')
+                loop.set_default_executor(self._executor)
+                self._slots = asyncio.Semaphore(self.concurrency)
+                threading.Thread(target=loop.run_forever, name='mercato-fetch-loop', daemon=True).start()
+                self._loop, self._loop_pid = loop, os.getpid()
+            return self._loop
+
+    def _submit(self, coro):
+        """Schedule coro on the fetcher's loop, returning a concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self._start())
+
+    def _backoff_delay(self, attempt):
+        """Exponential backoff with equal jitter, so retries don't arrive together"""
+        delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    async def fetch(self, fn, *args, timeout=None, key=None):
+        """await fn(*args) in a worker thread, retrying until it succeeds
+
+        Raises the last error once every retry has failed. Calls with the
+        same key while one is in flight wait for it and share its outcome.
+        """
+        reclaim = False
+        while key is not None:
+            mine, waiting = self.flights.claim([key], count=not reclaim)
+            if mine:
+                break
+            try:
+                return await asyncio.wrap_future(waiting[key])
+            except FlightCancelled:
+                reclaim = True  # its caller went away, so fetch it ourselves
+        if key is None:
+            return await self._fetch(fn, *args, timeout=timeout)
+
+        try:
+            result = await self._fetch(fn, *args, timeout=timeout)
+        except Exception as e:
+            self.flights.release(key, error=e)
+            raise
+        except BaseException:
+            self.flights.release(key, error=FlightCancelled(key))
+            raise
+        self.flights.release(key, result)
+        return result
+
+    async def _fetch(self, fn, *args, timeout=None):
+        """One call with its retries, timed as stage provider.<method> overall and per ticker"""
+        name, ticker = describe_call(fn, args)
+        start = time.perf_counter()
+        try:
+            return await self._fetch_with_retries(fn, name, *args, timeout=timeout)
+        finally:
+            observe(f'provider.{name}', time.perf_counter() - start, ticker)
+
+    async def _fetch_with_retries(self, fn, name, *args, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        for attempt in range(self.retries + 1):
+            wait = self.limiter.reserve()
+            if wait > 0:
+                self.stats.incr('rate_limited')
+                await asyncio.sleep(wait)
+
+            self.stats.incr('requests')
+            try:
+                async with self._slots:
+                    # run_in_executor rather than to_thread: cancelling its future on timeout
+                    # leaves the worker thread behind instead of waiting for it
+                    call = asyncio.get_running_loop().run_in_executor(None, functools.partial(fn, *args))
+                    result = await (asyncio.wait_for(call, timeout) if timeout else call)
+                self.stats.incr('succeeded')
+                return result
+            except asyncio.CancelledError:
+                raise
+            except asyncio.TimeoutError as e:
+                self.stats.incr('timeouts')
+                incr('provider_errors', call=name, kind='timeout')
+                error = e
+            except Exception as e:
+                error = e
+                if is_throttle(e):
+                    self.stats.incr('throttled')
+                    incr('provider_errors', call=name, kind='throttled')
+                    self.limiter.pause(self._backoff_delay(attempt))
+                else:
+                    incr('provider_errors', call=name, kind='error')
+
+            self.stats.last_error = f"{type(error).__name__}: {error}"
+            if attempt == self.retries:
+                self.stats.incr('failed')
+                raise error
+            self.stats.incr('retries')
+            await asyncio.sleep(self._backoff_delay(attempt))
+
+    def call(self, fn, *args, timeout=None, key=None, **kwargs):
+        """fn(*args, **kwargs) through the limiter and retries, from synchronous code
+
+        Each attempt is bounded by its timeout on the fetcher's loop, so this
+        returns or raises within the retry budget however long the provider hangs.
+        """
+        future = self._submit(self.fetch(functools.partial(fn, *args, **kwargs), timeout=timeout, key=key))
+        try:
+            return future.result()
+        except BaseException:
+            future.cancel()
+            raise
+
+    def stream(self, fn, keys, concurrency=None, timeout=None, dataset=None):
+        """Start calling fn(key) for every key, returning a FetchStream of the results
+
+        The calls start straight away on the fetcher's loop, at most
+        concurrency of this stream's at a time on top of the process-wide
+        cap. With a dataset name, each call is coalesced with in-flight
+        calls for the same (dataset, key).
+        """
+        keys = list(dict.fromkeys(keys))
+        results = queue.Queue()
+        if not keys:
+            return FetchStream(results, 0, None)
+        concurrency = max(1, min(concurrency or self.concurrency, len(keys)))
+
+        async def fetch_one(semaphore, key):
+            async with semaphore:
+                try:
+                    result = await self.fetch(fn, key, key=None if dataset is None else (dataset, key))
+                except Exception:
+                    result = None
+            results.put((key, result))
+
+        async def fetch_all():
+            semaphore = asyncio.Semaphore(concurrency)
+            await asyncio.gather(*(fetch_one(semaphore, key) for key in keys))
+
+        return FetchStream(results, len(keys), self._submit(fetch_all()), timeout)
+
+    def map(self, fn, keys, concurrency=None, dataset=None):
+        """{key: fn(key)} for every key that succeeded"""
+        stream = self.stream(fn, keys, concurrency, dataset=dataset)
+        return {key: result for key, result in stream if result is not None}
+
+
+_fetcher = None
+_fetcher_lock = threading.Lock()
+
+
+def get_fetcher():
+    """The process-wide fetcher, so every job shares one rate limit"""
+    global _fetcher
+    with _fetcher_lock:
+        if _fetcher is None:
+            _fetcher = Fetcher()
+        return _fetcher
+
+
+def set_fetcher(fetcher):
+    """Swap the process-wide fetcher, e.g. to lift the rate limit for offline benchmarks"""
+    global _fetcher
+    with _fetcher_lock:
+        _fetcher = fetcher
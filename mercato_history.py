@@ -0,0 +1,314 @@
+"""
+Mercato score history
+Daily scores backfilled over the stored price history, so the detail page
+can chart how a stock's score has moved. Each day is scored on the year
+of bars up to it with the same vectorized ladders as today's score, all
+days and tickers in one pass, without any network calls
+"""
+
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from multiprocessing import get_context
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from mercato_data import (HISTORY_PERIOD, CompactHistory, benchmark_for, build_stock_data,
+                          cached_benchmark_history, get_benchmark_history, get_fundamentals_store,
+                          get_price_store)
+from mercato_metrics import timed
+from mercato_parallel import SharedArrays
+from mercato_providers import period_start
+from mercato_scoring import FRAME_COLUMNS, PRICE_FEATURE_COLUMNS, score_frame
+from mercato_store import SCORE_HISTORY_COLUMNS, ScoreHistoryStore
+
+# The trailing bars each day's score sees, like the HISTORY_PERIOD today's score uses
+LOOKBACK = pd.DateOffset(years=1)
+# Days with fewer bars than this behind them aren't scored, since 3-month momentum needs them
+WARMUP_BARS = 63
+FUNDAMENTAL_SCORES = ['financial_health', 'profitability', 'growth']
+# Fewer tickers than this are scored in-process, since starting workers would cost more
+PARALLEL_MIN_TICKERS = 50
+
+_score_history_store = None
+_store_lock = threading.Lock()
+
+
+def get_score_history_store():
+    """The process-wide score history store, opened on first use"""
+    global _score_history_store
+    with _store_lock:
+        if _score_history_store is None:
+            _score_history_store = ScoreHistoryStore()
+        return _score_history_store
+
+
+def _windows(values, width):
+    """(days, width) matrix whose row t holds values[t - width + 1 .. t], NaN before the first day"""
+    return sliding_window_view(np.r_[np.full(width - 1, np.nan), values], width)
+
+
+def _bench_arrays(bench_close, stored=None):
+    """A benchmark close Series as (naive day dates, closes) arrays, empty when there is none
+
+    stored is the benchmark's (tz, dates, bars) from the price store, if it
+    has been stored there; its bars fill in days before bench_close starts,
+    so backfills over longer histories than HISTORY_PERIOD keep a benchmark.
+    """
+    dates, closes = np.empty(0, dtype='datetime64[ns]'), np.empty(0)
+    if bench_close is not None:
+        index = bench_close.index.tz_localize(None) if bench_close.index.tz is not None else bench_close.index
+        dates, closes = index.normalize().to_numpy(), bench_close.to_numpy(dtype=float)
+    if stored is not None:
+        _, stored_dates, bars = stored
+        earlier = stored_dates < dates[0] if len(dates) else np.ones(len(stored_dates), dtype=bool)
+        dates, closes = np.r_[stored_dates[earlier], dates], np.r_[bars[earlier, 3], closes]
+    return dates, closes
+
+
+def daily_frame(data, dates, bars, bench):
+    """A stock_frame with one row per stored bar, as if the stock were scored that day
+
+    data is the stock's build_stock_data dict, whose fundamentals are used
+    for every day. dates and bars are as PriceStore.read_columns returns
+    them. Price, the 52-week high and low, returns and drawdown come from
+    the bars within LOOKBACK of each day, and benchmark returns from the
+    _bench_arrays closes up to that day.
+    """
+    days = len(dates)
+    index = pd.DatetimeIndex(dates)
+    starts = np.searchsorted(dates, (index - LOOKBACK).to_numpy(), side='left')
+    counts = np.arange(days) - starts + 1
+    width = int(counts.max())
+    # Cells of each day's window that fall before its lookback
+    outside = np.arange(width) < (starts - np.arange(days) + width - 1)[:, None]
+
+    _, high, low, close, _ = bars.T
+    previous = np.r_[close[:1], close[:-1]]
+    closes = _windows(close, width)
+
+    fundamentals = pd.to_numeric(pd.Series([data.get(col) for col in FRAME_COLUMNS]), errors='coerce')
+    columns = {col: np.full(days, value, dtype=float) for col, value in zip(FRAME_COLUMNS, fundamentals)}
+    columns['price'] = close
+    columns['prev_close'] = previous
+    columns['fifty_two_week_high'] = np.where(outside, -np.inf, _windows(high, width)).max(axis=1)
+    columns['fifty_two_week_low'] = np.where(outside, np.inf, _windows(low, width)).min(axis=1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        features = {'bars': counts, 'volatility': np.full(days, np.nan)}
+        bench_dates, bench = bench
+        positions = np.searchsorted(bench_dates, dates, side='right') - 1
+        for name, offset in [('1m', 20), ('3m', 62)]:
+            stock = np.where(counts > offset, close / close[np.maximum(np.arange(days) - offset, 0)] - 1, np.nan)
+            bench_return = np.full(days, np.nan)
+            if len(bench):
+                bench_return = np.where(
+                    positions >= offset, bench[positions] / bench[np.maximum(positions - offset, 0)] - 1, np.nan
+                )
+            features[f'return_{name}'] = stock
+            features[f'bench_return_{name}'] = bench_return
+            features[f'relative_return_{name}'] = stock - bench_return
+
+        running_max = np.maximum.accumulate(np.where(outside, -np.inf, closes), axis=1)
+        drawdowns = np.where(outside, np.inf, (closes - running_max) / running_max)
+        features['max_drawdown'] = np.abs(drawdowns.min(axis=1))
+
+    for col in PRICE_FEATURE_COLUMNS:
+        columns[col] = features[col]
+    return pd.DataFrame(columns, index=index)
+
+
+def _carry_fundamentals(dates, scores, recorded, fetched_at):
+    """Keep the fundamentals sub-scores earlier runs recorded for days before the current fetch
+
+    The stored fundamentals only describe the company since they were
+    fetched, so older days forward-fill what was recorded at the time and
+    fall back to the current numbers only where nothing was. scores is an
+    array of SCORE_HISTORY_COLUMNS rows and recorded the stored (dates,
+    scores) from ScoreHistoryStore.read_columns.
+    """
+    if recorded is None or fetched_at is None:
+        return scores
+    fetched_day = pd.Timestamp(fetched_at, unit='s').normalize().to_datetime64()
+    recorded_dates, recorded_scores = recorded
+    earlier = recorded_dates < fetched_day
+    positions = np.searchsorted(recorded_dates[earlier], dates, side='right') - 1
+    carried = (dates < fetched_day) & (positions >= 0)
+    if not carried.any():
+        return scores
+
+    scores = scores.copy()
+    fundamentals = [SCORE_HISTORY_COLUMNS.index(col) for col in FUNDAMENTAL_SCORES]
+    scores[np.ix_(carried, fundamentals)] = recorded_scores[earlier][positions[carried]][:, fundamentals]
+    # Only the rounded sub-scores are stored, so summing them can be 0.1 off
+    # the final_score scored from unrounded ones; a day whose sub-scores all
+    # match what was recorded for it keeps its recorded final_score
+    scores[carried, -1] = [round(total, 1) for total in scores[carried, :-1].sum(axis=1).tolist()]
+    same_day = np.searchsorted(recorded_dates, dates).clip(max=len(recorded_dates) - 1)
+    keep = carried & (recorded_dates[same_day] == dates)
+    keep[keep] = _same_rows(scores[keep, :-1], recorded_scores[same_day[keep], :-1])
+    scores[keep, -1] = recorded_scores[same_day[keep], -1]
+    return scores
+
+
+def _same_rows(a, b):
+    """Whether each row of a equals the same row of b, counting NaN as equal to NaN"""
+    return np.all((a == b) | (np.isnan(a) & np.isnan(b)), axis=1)
+
+
+def _score_days(jobs):
+    """Score every day of each (data, dates, bars, bench) daily_frame job, all in one score_frame
+
+    Returns the bars behind each day and its SCORE_HISTORY_COLUMNS, with the
+    jobs' days one after another.
+    """
+    frames = [daily_frame(*job) for job in jobs]
+    counts = np.concatenate([frame['bars'].to_numpy() for frame in frames])
+    return counts, score_frame(pd.concat(frames))[SCORE_HISTORY_COLUMNS].to_numpy()
+
+
+def _fill_scores(shared, first, last):
+    offsets, bench_offsets = shared['offsets'], shared['bench_offsets']
+    jobs = []
+    for i in range(first, last):
+        rows = slice(offsets[i], offsets[i + 1])
+        bench = slice(bench_offsets[shared['benchmark'][i]], bench_offsets[shared['benchmark'][i] + 1])
+        jobs.append((
+            dict(zip(FRAME_COLUMNS, shared['fundamentals'][i])),
+            shared['dates'][rows],
+            shared['bars'][rows],
+            (shared['bench_dates'][bench], shared['bench_closes'][bench])
+        ))
+    rows = slice(offsets[first], offsets[last])
+    shared['counts'][rows], shared['scores'][rows] = _score_days(jobs)
+
+
+def _score_days_shared(spec, first, last):
+    """Pool task: score tickers first to last of a shared universe into its output arrays"""
+    shared = SharedArrays.attach(spec)
+    try:
+        _fill_scores(shared, first, last)
+    finally:
+        shared.close()
+
+
+def _score_days_parallel(jobs, workers):
+    """_score_days spread over a pool of workers processes
+
+    Every job's bars, fundamentals and benchmark go into one shared memory
+    block, which workers attach to without copying, and each worker writes
+    its tickers' scores straight into a shared output array. Tickers are
+    split into contiguous chunks of about equal days.
+    """
+    offsets = np.r_[0, np.cumsum([len(dates) for _, dates, _, _ in jobs])]
+    benches = list({id(bench): bench for *_, bench in jobs}.values())
+    positions = {id(bench): i for i, bench in enumerate(benches)}
+    fundamentals = pd.DataFrame([{col: data.get(col) for col in FRAME_COLUMNS} for data, *_ in jobs], columns=FRAME_COLUMNS)
+    arrays = {
+        'offsets': offsets,
+        'dates': np.concatenate([dates for _, dates, _, _ in jobs]),
+        'bars': np.concatenate([bars for _, _, bars, _ in jobs]),
+        'fundamentals': fundamentals.apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float),
+        'benchmark': np.array([positions[id(bench)] for *_, bench in jobs]),
+        'bench_offsets': np.r_[0, np.cumsum([len(dates) for dates, _ in benches])],
+        'bench_dates': np.concatenate([dates for dates, _ in benches]),
+        'bench_closes': np.concatenate([closes for _, closes in benches]),
+        'counts': ((offsets[-1],), np.int64),
+        'scores': ((offsets[-1], len(SCORE_HISTORY_COLUMNS)), np.float64)
+    }
+    chunks = np.unique(np.searchsorted(offsets, np.linspace(0, offsets[-1], workers * 4 + 1)))
+    chunks[-1] = len(jobs)
+
+    with SharedArrays.create(arrays) as shared:
+        with ProcessPoolExecutor(min(workers, len(chunks) - 1), mp_context=get_context('spawn')) as pool:
+            list(pool.map(_score_days_shared, repeat(shared.spec), chunks[:-1], chunks[1:]))
+        return shared['counts'].copy(), shared['scores'].copy()
+
+
+@timed('history.backfill_scores')
+def backfill_scores(tickers, workers=1, offline=False):
+    """Score every stored day of each ticker and save it to the score history store
+
+    Bars come from the price store and fundamentals from the fundamentals
+    store, and all days of all tickers go through score_frame together, or
+    are split across workers processes once there are PARALLEL_MIN_TICKERS.
+    Only days whose scores changed are written, and each ticker is marked
+    scored through its last bar. Returns {ticker: DataFrame} of the daily
+    SCORE_HISTORY_COLUMNS, from the first day with WARMUP_BARS behind it.
+
+    offline never touches the network: benchmarks come from the cache and
+    the price store only, and tickers whose benchmark has neither are skipped.
+    """
+    tickers = list(dict.fromkeys(tickers))
+    columns = get_price_store().read_columns(tickers)
+    stored = get_fundamentals_store().read(tickers)
+    store = get_score_history_store()
+
+    benchmarks = {}
+    jobs = {}
+    for ticker in tickers:
+        if ticker not in columns:
+            continue
+        tz, dates, bars = columns[ticker]
+        info, fetched_at = stored.get(ticker, (None, None))
+        data = build_stock_data(ticker, info, CompactHistory(ticker, dates.astype(np.int64), *bars.T, tz=tz))
+        symbol = benchmark_for(data['sector'])
+        if symbol not in benchmarks:
+            stored_bench = get_price_store().read_columns([symbol]).get(symbol)
+            load = cached_benchmark_history if offline else get_benchmark_history
+            try:
+                benchmarks[symbol] = _bench_arrays(load(symbol), stored_bench)
+            except Exception:
+                benchmarks[symbol] = _bench_arrays(None, stored_bench)
+        if offline and not len(benchmarks[symbol][0]):
+            continue
+        jobs[ticker] = (data, dates, bars, benchmarks[symbol])
+    if not jobs:
+        return {}
+
+    if workers > 1 and len(jobs) >= PARALLEL_MIN_TICKERS:
+        counts, scores = _score_days_parallel(list(jobs.values()), workers)
+    else:
+        counts, scores = _score_days(list(jobs.values()))
+    recorded = store.read_columns(jobs)
+
+    history, changed = {}, {}
+    offset = 0
+    for ticker, (_, days, _, _) in jobs.items():
+        rows = slice(offset, offset + len(days))
+        offset += len(days)
+        scored = counts[rows] >= WARMUP_BARS
+        dates = days[scored]
+        ticker_scores = _carry_fundamentals(
+            dates, scores[rows][scored], recorded.get(ticker), stored.get(ticker, (None, None))[1]
+        )
+        history[ticker] = pd.DataFrame(
+            ticker_scores, index=pd.DatetimeIndex(dates, name='Date'), columns=SCORE_HISTORY_COLUMNS
+        )
+
+        new = np.ones(len(dates), dtype=bool)
+        if ticker in recorded:
+            recorded_dates, recorded_scores = recorded[ticker]
+            _, rows_now, rows_before = np.intersect1d(dates, recorded_dates, return_indices=True)
+            same = _same_rows(ticker_scores[rows_now], recorded_scores[rows_before])
+            new[rows_now[same]] = False
+        if new.any():
+            changed[ticker] = history[ticker][new]
+    store.write(changed, through={ticker: days[-1] for ticker, (_, days, _, _) in jobs.items() if len(days)})
+    return history
+
+
+def score_history(ticker, period=HISTORY_PERIOD):
+    """Daily scores for a ticker over period, backfilling first if newer bars have been stored
+
+    This runs while a page renders, so the backfill is offline: stored bars
+    and cached benchmarks only.
+    """
+    store = get_score_history_store()
+    scored_through = store.scored_through([ticker]).get(ticker)
+    last_bar = get_price_store().last_dates([ticker]).get(ticker)
+    if last_bar is not None and (scored_through is None or scored_through < last_bar):
+        backfill_scores([ticker], offline=True)
+    return store.read(ticker, start=period_start(period))
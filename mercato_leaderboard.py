@@ -0,0 +1,172 @@
+"""
+Mercato leaderboard
+Scores every S&P 500 constituent and saves a ranked snapshot, so reading the
+leaderboard is a file lookup instead of 500 scoring runs, along with the
+percentile tables peer-relative scores are looked up in and each stock's
+daily score history
+
+Run it on a schedule (e.g. nightly from cron):
+    python mercato_leaderboard.py
+"""
+
+import io
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import pandas as pd
+import requests
+
+from mercato_data import prefetch_stock_data
+from mercato_fetch import get_fetcher
+from mercato_history import backfill_scores
+from mercato_percentiles import PERCENTILES_PATH, PercentileTables
+from mercato_scoring import score_stocks, stock_frame
+from mercato_store import DATA_DIR
+
+SP500_URL = 'https://en.wikipedia.org/wiki/List_of_S%26P_500_companies'
+CONSTITUENTS_PATH = os.path.join(DATA_DIR, 'sp500.csv')
+CONSTITUENTS_TTL = 7 * 24 * 60 * 60
+SNAPSHOT_PATH = os.path.join(DATA_DIR, 'leaderboard.json')
+MAX_WORKERS = 16
+
+_snapshot = None
+_snapshot_mtime = None
+_snapshot_lock = threading.Lock()
+
+
+def _download_constituents():
+    response = requests.get(SP500_URL, headers={'User-Agent': 'Mercato/1.0'}, timeout=30)
+    response.raise_for_status()
+    table = pd.read_html(io.StringIO(response.text), attrs={'id': 'constituents'})[0]
+    return pd.DataFrame({
+        # Yahoo writes share classes with a dash (BRK-B), Wikipedia with a dot
+        'ticker': table['Symbol'].str.replace('.', '-', regex=False),
+        'name': table['Security'],
+        'sector': table['GICS Sector']
+    })
+
+
+def load_sp500_constituents():
+    """S&P 500 tickers with company name and GICS sector
+
+    The list is cached in CONSTITUENTS_PATH and re-downloaded weekly. If the
+    download fails an older cached copy is used.
+    """
+    cached = os.path.exists(CONSTITUENTS_PATH)
+    if cached and time.time() - os.path.getmtime(CONSTITUENTS_PATH) < CONSTITUENTS_TTL:
+        return pd.read_csv(CONSTITUENTS_PATH)
+
+    try:
+        constituents = _download_constituents()
+    except Exception:
+        if cached:
+            return pd.read_csv(CONSTITUENTS_PATH)
+        raise
+
+    os.makedirs(DATA_DIR, exist_ok=True)
+    constituents.to_csv(CONSTITUENTS_PATH, index=False)
+    return constituents
+
+
+def leaderboard_record(rank, score, name=None):
+    """One leaderboard row in the shape mercato-ui expects"""
+    return {
+        'rank': rank,
+        'ticker': score['ticker'],
+        'name': name or score['company_name'],
+        'sector': score['sector'],
+        'current_price': round(float(score['price']), 2),
+        'price_change_pct': round(float(score['price_change']), 2),
+        'financial_health': float(score['financial_health']),
+        'profitability': float(score['profitability']),
+        'growth': float(score['growth']),
+        'momentum': float(score['momentum']),
+        'stability': float(score['stability']),
+        'final_score': float(score['final_score']),
+        'peer_score': float(score['peer_score']) if 'peer_score' in score else None
+    }
+
+
+def build_leaderboard(tickers=None, names=None, max_workers=MAX_WORKERS):
+    """Score tickers (the S&P 500 by default) and rank them by final_score
+
+    Returns the snapshot and the PercentileTables of the same universe,
+    which its peer scores are ranked against.
+    """
+    if tickers is None:
+        constituents = load_sp500_constituents()
+        tickers = list(constituents['ticker'])
+        names = dict(zip(constituents['ticker'], constituents['name']))
+    names = names or {}
+
+    stock_data = prefetch_stock_data(tickers, max_workers=max_workers)
+    percentiles = PercentileTables.build(stock_frame(stock_data), [data['sector'] for data in stock_data.values()])
+    scores = sorted(score_stocks(stock_data, percentiles), key=lambda s: s['final_score'], reverse=True)
+
+    snapshot = {
+        'as_of': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'universe': len(tickers),
+        'stocks': [leaderboard_record(i + 1, s, names.get(s['ticker'])) for i, s in enumerate(scores)]
+    }
+    return snapshot, percentiles
+
+
+def write_snapshot(snapshot, path=SNAPSHOT_PATH):
+    """Save a snapshot atomically so readers never see a half-written file"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(snapshot, f)
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(path=SNAPSHOT_PATH):
+    """The latest saved snapshot, or None if the job hasn't run yet
+
+    The parsed file is kept in memory and only reloaded when it changes on disk.
+    """
+    global _snapshot, _snapshot_mtime
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+
+    with _snapshot_lock:
+        if _snapshot is None or mtime != _snapshot_mtime:
+            with open(path) as f:
+                _snapshot = json.load(f)
+            _snapshot_mtime = mtime
+        return _snapshot
+
+
+def get_leaderboard(limit=500, sector=None):
+    """Top rows of the latest snapshot, optionally for one sector"""
+    snapshot = read_snapshot()
+    if snapshot is None:
+        return None
+    stocks = snapshot['stocks']
+    if sector:
+        stocks = [s for s in stocks if s['sector'] == sector]
+    return {'as_of': snapshot['as_of'], 'stocks': stocks[:limit]}
+
+
+def main():
+    start = time.time()
+    snapshot, percentiles = build_leaderboard()
+    write_snapshot(snapshot)
+    percentiles.save()
+    print(f"Scored {len(snapshot['stocks'])} of {snapshot['universe']} stocks in {time.time() - start:.1f}s -> {SNAPSHOT_PATH}")
+    print(f"Percentile tables for {len(percentiles.tables)} metric/sector pairs -> {PERCENTILES_PATH}")
+    backfill_start = time.time()
+    history = backfill_scores([stock['ticker'] for stock in snapshot['stocks']], workers=os.cpu_count() or 1)
+    print(f"Backfilled score history for {len(history)} stocks in {time.time() - backfill_start:.1f}s")
+    stats = get_fetcher().stats.snapshot()
+    print(f"{stats['requests']} requests: {stats['retries']} retried, {stats['throttled']} throttled, "
+          f"{stats['timeouts']} timed out, {stats['failed']} failed, {stats['deduplicated']} deduplicated")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""
+Mercato metrics
+Process-wide timings and counters for each stage of loading, scoring and
+drawing stocks: latency histograms per stage and per ticker, cache hits and
+misses, and provider errors. Read them as Prometheus text from the API's
+/metrics, or in the app's debug panel (open the app with ?debug=1)
+
+Recording costs a couple of microseconds per stage; set MERCATO_METRICS=0
+to turn it off.
+"""
+
+import bisect
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+ENABLED = os.environ.get('MERCATO_METRICS', '1') != '0'
+# Upper bounds of the latency buckets, in seconds, as in a Prometheus histogram
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Tickers tracked per stage; later ones are pooled under OTHER so the export stays bounded
+MAX_TICKERS = 1000
+OTHER = '_other'
+PREFIX = 'mercato'
+
+
+class Histogram:
+    """Observations counted per BUCKETS bucket, with their exact count, sum and max"""
+
+    __slots__ = ('counts', 'count', 'sum', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def copy(self):
+        other = Histogram()
+        other.counts = list(self.counts)
+        other.count, other.sum, other.max = self.count, self.sum, self.max
+        return other
+
+    def quantile(self, q):
+        """Estimated q-quantile, interpolated within its bucket like Prometheus' histogram_quantile"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        below = 0
+        for i, n in enumerate(self.counts):
+            if n and below + n >= rank:
+                lower = BUCKETS[i - 1] if i else 0.0
+                upper = BUCKETS[i] if i < len(BUCKETS) else self.max
+                return min(lower + (upper - lower) * (rank - below) / n, self.max)
+            below += n
+        return self.max
+
+
+class Metrics:
+    """Thread-safe registry of stage histograms, per-ticker histograms and labelled counters"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages = {}
+        self.tickers = {}
+        self.counters = {}
+        self.started_at = time.time()
+
+    def observe(self, stage, seconds, ticker=None):
+        with self._lock:
+            hist = self.stages.get(stage)
+            if hist is None:
+                hist = self.stages[stage] = Histogram()
+            hist.observe(seconds)
+            if ticker is None:
+                return
+            per_ticker = self.tickers.setdefault(stage, {})
+            hist = per_ticker.get(ticker)
+            if hist is None:
+                if len(per_ticker) >= MAX_TICKERS:
+                    ticker = OTHER
+                hist = per_ticker.setdefault(ticker, Histogram())
+            hist.observe(seconds)
+
+    def incr(self, name, n=1, **labels):
+        """Add n to the counter name with labels, e.g. incr('cache_hits', cache='quotes')"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + n
+
+    def snapshot(self):
+        """Copies of (stages, tickers, counters), safe to read while recording goes on"""
+        with self._lock:
+            return (
+                {stage: hist.copy() for stage, hist in self.stages.items()},
+                {stage: {t: hist.copy() for t, hist in hists.items()} for stage, hists in self.tickers.items()},
+                dict(self.counters)
+            )
+
+    def reset(self):
+        with self._lock:
+            self.stages.clear()
+            self.tickers.clear()
+            self.counters.clear()
+            self.started_at = time.time()
+
+
+_metrics = Metrics()
+
+
+def get_metrics():
+    """The process-wide metrics registry"""
+    return _metrics
+
+
+def observe(stage, seconds, ticker=None):
+    if ENABLED:
+        _metrics.observe(stage, seconds, ticker)
+
+
+def incr(name, n=1, **labels):
+    if ENABLED and n:
+        _metrics.incr(name, n, **labels)
+
+
+def count_cache(cache, hits=0, misses=0):
+    """Record lookups of a named cache"""
+    incr('cache_hits', hits, cache=cache)
+    incr('cache_misses', misses, cache=cache)
+
+
+@contextmanager
+def timer(stage, ticker=None):
+    """Time the body of a with block as one observation of stage"""
+    if not ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _metrics.observe(stage, time.perf_counter() - start, ticker)
+
+
+def timed(stage, per_ticker=False):
+    """Decorator timing every call of a function as stage
+
+    With per_ticker, the function's first argument is the ticker the call
+    is also recorded under.
+    """
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _metrics.observe(stage, time.perf_counter() - start, args[0] if per_ticker and args else None)
+        return wrapper
+    return decorate
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels):
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in labels)
+
+
+def _histogram_lines(name, hist, labels):
+    lines = []
+    cumulative = 0
+    for bound, n in zip(BUCKETS + (float('inf'),), hist.counts):
+        cumulative += n
+        le = '+Inf' if bound == float('inf') else repr(bound)
+        lines.append(f'{name}_bucket{{{_labels(labels + [("le", le)])}}} {cumulative}')
+    lines.append(f'{name}_sum{{{_labels(labels)}}} {hist.sum!r}')
+    lines.append(f'{name}_count{{{_labels(labels)}}} {hist.count}')
+    return lines
+
+
+def render_prometheus(fetch_stats=None):
+    """Every metric in the Prometheus text exposition format
+
+    Stages are exported as full histograms. Per-ticker timings are exported
+    only as a _sum and _count pair, so each ticker adds two series per stage
+    rather than a series per bucket; their buckets stay in the debug panel.
+    fetch_stats is a FetchStats snapshot to include as
+    mercato_fetch_events_total, so one scrape covers the fetcher too.
+    """
+    stages, tickers, counters = _metrics.snapshot()
+    lines = [
+        f'# HELP {PREFIX}_stage_seconds Time spent in each stage',
+        f'# TYPE {PREFIX}_stage_seconds histogram'
+    ]
+    for stage in sorted(stages):
+        lines += _histogram_lines(f'{PREFIX}_stage_seconds', stages[stage], [('stage', stage)])
+
+    lines += [
+        f'# HELP {PREFIX}_ticker_stage_seconds Time spent in each stage, per ticker',
+        f'# TYPE {PREFIX}_ticker_stage_seconds summary'
+    ]
+    for stage in sorted(tickers):
+        for ticker in sorted(tickers[stage]):
+            hist, labels = tickers[stage][ticker], _labels([('stage', stage), ('ticker', ticker)])
+            lines.append(f'{PREFIX}_ticker_stage_seconds_sum{{{labels}}} {hist.sum!r}')
+            lines.append(f'{PREFIX}_ticker_stage_seconds_count{{{labels}}} {hist.count}')
+
+    by_name = {}
+    for (name, labels), value in counters.items():
+        by_name.setdefault(name, []).append((labels, value))
+    for name in sorted(by_name):
+        lines.append(f'# TYPE {PREFIX}_{name}_total counter')
+        for labels, value in sorted(by_name[name]):
+            lines.append(f'{PREFIX}_{name}_total{{{_labels(labels)}}} {value}')
+
+    if fetch_stats:
+        lines.append(f'# TYPE {PREFIX}_fetch_events_total counter')
+        for event, value in fetch_stats.items():
+            lines.append(f'{PREFIX}_fetch_events_total{{{_labels([("event", event)])}}} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def summarize(histograms):
+    """Count, total, mean, p50, p95 and max in milliseconds for each of {name: Histogram}, largest total first"""
+    rows = [
+        {
+            'name': name,
+            'count': hist.count,
+            'total_ms': hist.sum * 1000,
+            'mean_ms': hist.sum / hist.count * 1000,
+            'p50_ms': hist.quantile(0.5) * 1000,
+            'p95_ms': hist.quantile(0.95) * 1000,
+            'max_ms': hist.max * 1000
+        }
+        for name, hist in histograms.items() if hist.count
+    ]
+    return sorted(rows, key=lambda row: row['total_ms'], reverse=True)
@@ -0,0 +1,76 @@
+"""
+Mercato parallel
+Numpy arrays in shared memory for process pools: the parent lays out its
+inputs once and workers attach to them without copying, so handing a
+universe of price history to every core costs nothing per task
+"""
+
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+class SharedArrays:
+    """Named numpy arrays packed into one shared memory block
+
+    The process that creates the block owns it and unlinks it on close;
+    its pool workers attach with attach(spec), where spec is the creator's
+    picklable .spec. Workers share their parent's resource tracker, so
+    attaching doesn't register the block a second time. Use as a context
+    manager so the block is always released.
+    """
+
+    # Keeps each array's start aligned for any dtype
+    ALIGN = 64
+
+    def __init__(self, shm, layout, owner):
+        self._shm = shm
+        self.layout = layout
+        self.owner = owner
+        self.arrays = {
+            name: np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf, offset=offset)
+            for name, (offset, shape, dtype) in layout.items()
+        }
+
+    @classmethod
+    def create(cls, arrays):
+        """Copy {name: array} into a new block; arrays given as (shape, dtype) are zero-filled"""
+        layout = {}
+        size = 0
+        for name, array in arrays.items():
+            shape, dtype = (array.shape, array.dtype) if isinstance(array, np.ndarray) else array
+            layout[name] = (size, tuple(shape), np.dtype(dtype).str)
+            size += -(-int(np.prod(shape)) * np.dtype(dtype).itemsize // cls.ALIGN) * cls.ALIGN
+
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        shared = cls(shm, layout, owner=True)
+        for name, array in arrays.items():
+            if isinstance(array, np.ndarray):
+                shared.arrays[name][...] = array
+            else:
+                shared.arrays[name].fill(0)
+        return shared
+
+    @classmethod
+    def attach(cls, spec):
+        name, layout = spec
+        return cls(shared_memory.SharedMemory(name=name), layout, owner=False)
+
+    @property
+    def spec(self):
+        return self._shm.name, self.layout
+
+    def __getitem__(self, name):
+        return self.arrays[name]
+
+    def close(self):
+        self.arrays = {}
+        self._shm.close()
+        if self.owner:
+            self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,171 @@
+"""
+Mercato percentiles
+Where each stock's raw metrics rank among the S&P 500, overall and within
+its sector. The leaderboard job saves every metric's values as sorted
+arrays, so ranking a stock against its peers is a binary search per metric
+"""
+
+import os
+import threading
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from mercato_store import DATA_DIR
+
+PERCENTILES_PATH = os.path.join(DATA_DIR, 'percentiles.npz')
+# Sectors with fewer stocks than this are ranked against the whole universe
+MIN_PEERS = 10
+OVERALL = ''
+
+# Raw metric -> (sub-score it feeds, whether higher is better)
+PEER_METRICS = {
+    'debt_ratio': ('financial_health', False),
+    'cash_ratio': ('financial_health', True),
+    'fcf_yield': ('financial_health', True),
+    'profit_margin': ('profitability', True),
+    'operating_margin': ('profitability', True),
+    'roe': ('profitability', True),
+    'revenue_growth': ('growth', True),
+    'earnings_growth': ('growth', True),
+    'relative_return_1m': ('momentum', True),
+    'relative_return_3m': ('momentum', True),
+    'beta': ('stability', False),
+    'range_volatility': ('stability', False),
+    'max_drawdown': ('stability', False),
+    'volatility': ('stability', False)
+}
+PEER_CATEGORIES = ['financial_health', 'profitability', 'growth', 'momentum', 'stability']
+PEER_COLUMNS = [f'peer_{category}' for category in PEER_CATEGORIES] + ['peer_score']
+
+_tables = None
+_tables_mtime = None
+_tables_lock = threading.Lock()
+
+
+def peer_metrics(frame):
+    """{metric: array} of the raw metric behind each PEER_METRICS entry, for every row of a stock_frame"""
+    def column(name):
+        values = frame[name].to_numpy()
+        if values.dtype.kind != 'f':
+            values = pd.to_numeric(frame[name], errors='coerce').to_numpy(dtype=float)
+        return values.copy()
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        market_cap = column('market_cap')
+        market_cap[~(market_cap > 0)] = np.nan
+        low = column('fifty_two_week_low')
+        low[~(low > 0)] = np.nan
+        metrics = {
+            'debt_ratio': column('total_debt') / market_cap,
+            'cash_ratio': column('total_cash') / market_cap,
+            'fcf_yield': column('free_cash_flow') / market_cap,
+            'range_volatility': (column('fifty_two_week_high') - low) / low
+        }
+    for name in PEER_METRICS:
+        if name not in metrics:
+            metrics[name] = column(name)
+        metrics[name][np.isinf(metrics[name])] = np.nan
+    return metrics
+
+
+class PercentileTables:
+    """Sorted values of every peer metric, keyed by (metric, sector)
+
+    The whole universe is stored under OVERALL, and each sector with at
+    least MIN_PEERS stocks under its own name.
+    """
+
+    def __init__(self, tables, as_of=None):
+        self.tables = tables
+        self.as_of = as_of
+
+    @classmethod
+    def build(cls, frame, sectors):
+        """Tabulate a stock_frame of the universe, with each row's sector"""
+        metrics = peer_metrics(frame)
+        sectors = np.array([OVERALL if s is None else s for s in sectors], dtype=object)
+        names, counts = np.unique(sectors.astype(str), return_counts=True)
+        groups = [OVERALL] + [s for s, n in zip(names, counts) if s != OVERALL and n >= MIN_PEERS]
+
+        tables = {}
+        for metric, values in metrics.items():
+            for group in groups:
+                column = values if group == OVERALL else values[sectors == group]
+                tables[metric, group] = np.sort(column[~np.isnan(column)])
+        return cls(tables, datetime.now(timezone.utc).isoformat(timespec='seconds'))
+
+    def save(self, path=PERCENTILES_PATH):
+        """Write the tables atomically as one .npz file"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        arrays = {f'{metric}|{group}': values for (metric, group), values in self.tables.items()}
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, __as_of__=np.array(self.as_of or ''), **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=PERCENTILES_PATH):
+        with np.load(path) as data:
+            tables = {tuple(key.split('|', 1)): data[key] for key in data.files if key != '__as_of__'}
+            as_of = str(data['__as_of__']) or None
+        return cls(tables, as_of)
+
+    def percentiles(self, metric, values, sectors):
+        """0-100 rank of each value among its sector's peers, best = 100
+
+        sectors is an array with one sector per value. Ties take the middle
+        of their range, and NaN values stay NaN.
+        """
+        higher_is_better = PEER_METRICS[metric][1]
+        ranks = np.full(len(values), np.nan)
+        for group in set(sectors):
+            table = self.tables.get((metric, group))
+            if table is None:
+                table = self.tables.get((metric, OVERALL))
+            if table is None or not len(table):
+                continue
+            rows = sectors == group
+            below = np.searchsorted(table, values[rows], side='left')
+            at_or_below = np.searchsorted(table, values[rows], side='right')
+            ranks[rows] = (below + at_or_below) / 2 / len(table) * 100
+        ranks[np.isnan(values)] = np.nan
+        return ranks if higher_is_better else 100 - ranks
+
+    def score(self, frame, sectors):
+        """Peer-relative 0-20 sub-scores and a 0-100 peer_score for every row of a stock_frame
+
+        Returns {column: array} for PEER_COLUMNS, in frame's row order. Each
+        sub-score is the mean percentile of its metrics; one with no usable
+        metric sits at the midpoint, 10.
+        """
+        metrics = peer_metrics(frame)
+        sectors = np.array([OVERALL if s is None else s for s in sectors], dtype=object)
+        ranks = {metric: self.percentiles(metric, values, sectors) for metric, values in metrics.items()}
+
+        scores = {}
+        for category in PEER_CATEGORIES:
+            stacked = np.column_stack([ranks[m] for m, (c, _) in PEER_METRICS.items() if c == category])
+            counts = (~np.isnan(stacked)).sum(axis=1)
+            mean = np.nansum(stacked, axis=1) / np.maximum(counts, 1)
+            scores[f'peer_{category}'] = np.round(np.where(counts > 0, mean / 100 * 20, 10.0), 1)
+        scores['peer_score'] = np.round(sum(scores[f'peer_{category}'] for category in PEER_CATEGORIES), 1)
+        return scores
+
+
+def read_percentile_tables(path=PERCENTILES_PATH):
+    """The latest saved tables, or None if the leaderboard job hasn't built any
+
+    They are kept in memory and only reloaded when the file changes on disk.
+    """
+    global _tables, _tables_mtime
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+
+    with _tables_lock:
+        if _tables is None or mtime != _tables_mtime:
+            _tables = PercentileTables.load(path)
+            _tables_mtime = mtime
+        return _tables
@@ -0,0 +1,198 @@
+"""
+Mercato portfolio analytics
+Share-weighted scores and risk for a whole portfolio: volatility, how the
+holdings move together and how many independent bets they amount to. The
+return covariance is kept as running sums, so new bars only add their own
+rows and changing shares never touches the price data
+"""
+
+from functools import reduce
+
+import numpy as np
+import pandas as pd
+
+from mercato_metrics import timed
+
+# Trailing daily returns the covariance is estimated over
+RISK_WINDOW = 252
+TRADING_DAYS = 252
+# Running sums are rebuilt from scratch after this many updates, so rounding can't build up
+REBUILD_EVERY = 100
+# Pairs moving together at least this closely are called out as an insight
+HIGH_CORRELATION = 0.8
+
+
+def aligned_returns(histories, window=RISK_WINDOW):
+    """Daily returns of each history on the dates they all share, as (dates, returns)
+
+    histories maps ticker to CompactHistory. returns has one row per date
+    and one column per ticker, covering at most the last window dates.
+    """
+    histories = list(histories.values())
+    if not histories:
+        return np.empty(0, dtype=np.int64), np.empty((0, 0))
+    common = reduce(np.intersect1d, [hist.dates[-(window + 1):] for hist in histories])
+    if len(common) < 2:
+        return np.empty(0, dtype=np.int64), np.empty((0, len(histories)))
+    closes = np.column_stack([
+        hist.close[np.searchsorted(hist.dates, common)].astype(float) for hist in histories
+    ])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = closes[1:] / closes[:-1] - 1
+    returns[~np.isfinite(returns)] = 0.0
+    return common[1:], returns
+
+
+class RiskModel:
+    """Covariance of the holdings' daily returns, updated as their bars change
+
+    Keeps the count, sum and sum of outer products of the return rows in
+    the window. An update only subtracts the rows that dropped out or were
+    revised and adds the new ones, so a day's new bar costs one row, not a
+    rebuild. A change of holdings starts over.
+    """
+
+    def __init__(self, window=RISK_WINDOW):
+        self.window = window
+        self._reset([])
+
+    def _reset(self, tickers):
+        self.tickers = list(tickers)
+        self.dates = np.empty(0, dtype=np.int64)
+        self.returns = np.empty((0, len(self.tickers)))
+        self._histories = {}
+        self._count = 0
+        self._sum = np.zeros(len(self.tickers))
+        self._outer = np.zeros((len(self.tickers), len(self.tickers)))
+        self._updates = 0
+        self._eigen = None
+        self._correlation = None
+
+    def update(self, histories):
+        """Bring the model up to date with {ticker: CompactHistory}
+
+        Histories are shared objects that are only replaced when their bars
+        change, so if every one is the object seen last time this is free.
+        """
+        if list(histories) == self.tickers and all(
+            histories[t] is self._histories.get(t) for t in self.tickers
+        ):
+            return
+        if list(histories) != self.tickers or self._updates >= REBUILD_EVERY:
+            self._reset(histories)
+
+        dates, returns = aligned_returns(histories, self.window)
+        _, old_rows, new_rows = np.intersect1d(self.dates, dates, return_indices=True)
+        unchanged = np.all(self.returns[old_rows] == returns[new_rows], axis=1)
+        keep_old = np.zeros(len(self.dates), dtype=bool)
+        keep_old[old_rows[unchanged]] = True
+        keep_new = np.zeros(len(dates), dtype=bool)
+        keep_new[new_rows[unchanged]] = True
+
+        removed, added = self.returns[~keep_old], returns[~keep_new]
+        self._count += len(added) - len(removed)
+        self._sum += added.sum(axis=0) - removed.sum(axis=0)
+        self._outer += added.T @ added - removed.T @ removed
+        self.dates, self.returns = dates, returns
+        self._histories = dict(histories)
+        self._updates += 1
+        self._eigen = None
+        self._correlation = None
+
+    def covariance(self):
+        """Daily return covariance between the tickers, or None with under two shared returns"""
+        if self._count < 2:
+            return None
+        mean = self._sum / self._count
+        return (self._outer - self._count * np.outer(mean, mean)) / (self._count - 1)
+
+    def eigen(self):
+        """Eigenvalues and eigenvectors of the covariance, cached until the next change"""
+        if self._eigen is None:
+            covariance = self.covariance()
+            if covariance is None:
+                return None
+            values, vectors = np.linalg.eigh(covariance)
+            self._eigen = (np.clip(values, 0, None), vectors)
+        return self._eigen
+
+    def correlation(self):
+        """Correlation matrix of the tickers' returns, cached until the next change"""
+        if self._correlation is None:
+            covariance = self.covariance()
+            if covariance is None:
+                return None
+            deviations = np.sqrt(np.clip(np.diag(covariance), 0, None))
+            with np.errstate(divide='ignore', invalid='ignore'):
+                correlation = covariance / np.outer(deviations, deviations)
+            correlation = np.clip(np.nan_to_num(correlation), -1, 1)
+            np.fill_diagonal(correlation, 1.0)
+            self._correlation = correlation
+        return self._correlation
+
+
+def effective_bets(weights, eigen):
+    """How many uncorrelated positions the portfolio's risk is spread across
+
+    Meucci's effective number of bets: the exponential of the entropy of
+    each principal component's share of portfolio variance. 1 means every
+    position rides on one factor, len(weights) that they're independent.
+    """
+    values, vectors = eigen
+    contributions = (vectors.T @ weights) ** 2 * values
+    total = contributions.sum()
+    if total <= 0:
+        return 1.0
+    shares = contributions[contributions > 0] / total
+    return float(np.exp(-np.sum(shares * np.log(shares))))
+
+
+@timed('portfolio.analyze_portfolio')
+def analyze_portfolio(stock_scores, shares, model):
+    """Value-weighted scores and risk for scored holdings
+
+    Positions are weighted by price times shares; if no shares are tracked
+    every holding counts equally. Risk covers holdings with at least two
+    bars on dates shared by all of them, updating model in place. Returns a
+    dict with the weights, weighted final_score and stability, annualized
+    volatility, the correlation matrix, effective_bets and the most
+    correlated pair (None where there isn't enough history).
+    """
+    tickers = [s['ticker'] for s in stock_scores]
+    values = np.array([s['price'] * (shares.get(s['ticker']) or 0) for s in stock_scores], dtype=float)
+    if values.sum() > 0:
+        weights = values / values.sum()
+    else:
+        weights = np.full(len(tickers), 1 / len(tickers)) if tickers else np.empty(0)
+
+    analytics = {
+        'weights': dict(zip(tickers, weights)),
+        'weighted_score': float(weights @ [s['final_score'] for s in stock_scores]) if tickers else 0.0,
+        'weighted_stability': float(weights @ [s['stability'] for s in stock_scores]) if tickers else 0.0,
+        'volatility': None,
+        'correlation': None,
+        'effective_bets': None,
+        'most_correlated': None
+    }
+
+    histories = {s['ticker']: s['hist'] for s in stock_scores if s.get('hist') is not None and len(s['hist']) > 1}
+    model.update(histories)
+    covariance = model.covariance()
+    if covariance is None:
+        return analytics
+
+    risk_weights = np.array([analytics['weights'][t] for t in model.tickers])
+    if risk_weights.sum() > 0:
+        risk_weights = risk_weights / risk_weights.sum()
+        variance = max(float(risk_weights @ covariance @ risk_weights), 0.0)
+        analytics['volatility'] = float(np.sqrt(variance * TRADING_DAYS))
+        analytics['effective_bets'] = effective_bets(risk_weights, model.eigen())
+
+    correlation = model.correlation()
+    analytics['correlation'] = pd.DataFrame(correlation, index=model.tickers, columns=model.tickers)
+
+    if len(model.tickers) > 1:
+        upper = np.triu(correlation, k=1) + np.tril(np.full_like(correlation, -np.inf))
+        i, j = np.unravel_index(np.argmax(upper), upper.shape)
+        analytics['most_correlated'] = (model.tickers[i], model.tickers[j], float(correlation[i, j]))
+    return analytics
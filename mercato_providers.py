@@ -0,0 +1,248 @@
+"""
+Mercato market data providers
+Every network call Mercato makes goes through a provider, so scoring and
+rendering can run against yfinance, a recording of it, or an offline replay
+
+Pick one with MERCATO_PROVIDER:
+    yfinance (default)  live Yahoo Finance data
+    record              live data, also saved under MERCATO_CAPTURE_DIR
+                        (default captures/ in MERCATO_DATA_DIR)
+    replay              only the saved captures, with MERCATO_REPLAY_LATENCY
+                        seconds of simulated delay per request
+"""
+
+import json
+import os
+import random
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+
+import pandas as pd
+import yfinance as yf
+
+from mercato_store import DATA_DIR
+
+CAPTURE_DIR = os.environ.get('MERCATO_CAPTURE_DIR', os.path.join(DATA_DIR, 'captures'))
+
+
+def period_start(period, now=None):
+    """First date covered by a yfinance-style period such as '5d', '6mo' or '1y'"""
+    now = pd.Timestamp(now or pd.Timestamp.now()).normalize()
+    count, unit = int(period.rstrip('dmoy')), period.lstrip('0123456789')
+    if unit == 'd':
+        return now - pd.DateOffset(days=count)
+    if unit == 'mo':
+        return now - pd.DateOffset(months=count)
+    return now - pd.DateOffset(years=count)
+
+
+class MarketDataProvider(ABC):
+    """The market data Mercato needs: price history and company info"""
+
+    @abstractmethod
+    def history(self, ticker, period='1y', interval='1d', start=None):
+        """Bars for one ticker, shaped like yf.Ticker.history()"""
+
+    def histories(self, tickers, period='1y', start=None):
+        """Daily bars for many tickers as {ticker: DataFrame}, leaving out tickers with none"""
+        histories = {}
+        for ticker in tickers:
+            hist = self.history(ticker, period=period, start=start)
+            if hist is not None and not hist.empty:
+                histories[ticker] = hist
+        return histories
+
+    @abstractmethod
+    def info(self, ticker):
+        """Company info for one ticker, shaped like yf.Ticker.info"""
+
+
+class YFinanceProvider(MarketDataProvider):
+    """Live data from Yahoo Finance"""
+
+    def history(self, ticker, period='1y', interval='1d', start=None):
+        if start is not None:
+            return yf.Ticker(ticker).history(start=start, interval=interval)
+        return yf.Ticker(ticker).history(period=period, interval=interval)
+
+    def histories(self, tickers, period='1y', start=None):
+        """Download many tickers in a single request"""
+        tickers = list(dict.fromkeys(tickers))
+        if not tickers:
+            return {}
+
+        # auto_adjust/actions/ignore_tz match what Ticker.history() returns
+        data = yf.download(
+            tickers,
+            period=period,
+            start=start,
+            group_by='ticker',
+            auto_adjust=True,
+            actions=True,
+            ignore_tz=False,
+            threads=True,
+            progress=False
+        )
+        if data is None or data.empty:
+            return {}
+
+        histories = {}
+        for ticker in tickers:
+            if isinstance(data.columns, pd.MultiIndex):
+                if ticker not in data.columns.get_level_values(0):
+                    continue
+                hist = data[ticker]
+            else:
+                hist = data
+            hist = hist.dropna(subset=['Close'])
+            if not hist.empty:
+                histories[ticker] = hist
+        return histories
+
+    def info(self, ticker):
+        return yf.Ticker(ticker).info
+
+
+def _capture_name(ticker):
+    return re.sub(r'[^A-Za-z0-9._-]', '_', ticker)
+
+
+class RecordingProvider(MarketDataProvider):
+    """Passes calls through to another provider and saves every response
+
+    Histories are kept per (ticker, interval), merged with anything already
+    captured, so repeated runs build up one complete series per ticker.
+    """
+
+    def __init__(self, provider, capture_dir=CAPTURE_DIR):
+        self.provider = provider
+        self.capture_dir = capture_dir
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(capture_dir, 'history'), exist_ok=True)
+        os.makedirs(os.path.join(capture_dir, 'info'), exist_ok=True)
+
+    def _save_history(self, ticker, interval, hist):
+        if hist is None or hist.empty:
+            return
+        path = os.path.join(self.capture_dir, 'history', f"{_capture_name(ticker)}_{interval}.pkl")
+        with self._lock:
+            if os.path.exists(path):
+                saved = pd.read_pickle(path)
+                hist = pd.concat([saved, hist])
+                hist = hist[~hist.index.duplicated(keep='last')].sort_index()
+            hist.to_pickle(path)
+
+    def history(self, ticker, period='1y', interval='1d', start=None):
+        hist = self.provider.history(ticker, period=period, interval=interval, start=start)
+        self._save_history(ticker, interval, hist)
+        return hist
+
+    def histories(self, tickers, period='1y', start=None):
+        histories = self.provider.histories(tickers, period=period, start=start)
+        for ticker, hist in histories.items():
+            self._save_history(ticker, '1d', hist)
+        return histories
+
+    def info(self, ticker):
+        info = self.provider.info(ticker)
+        if info:
+            path = os.path.join(self.capture_dir, 'info', f"{_capture_name(ticker)}.json")
+            with open(path, 'w') as f:
+                json.dump(info, f, default=str)
+        return info
+
+
+class ReplayProvider(MarketDataProvider):
+    """Serves captured data with no network access
+
+    Periods are measured back from the last captured bar, so a replay gives the
+    same answer whenever it runs. Each request sleeps latency seconds, plus up
+    to jitter more, to stand in for Yahoo's response time. Tickers that were
+    never captured come back empty, as unknown symbols do from Yahoo.
+    """
+
+    def __init__(self, capture_dir=CAPTURE_DIR, latency=0.0, jitter=0.0):
+        self.capture_dir = capture_dir
+        self.latency = latency
+        self.jitter = jitter
+        self._histories = {}
+        self._lock = threading.Lock()
+
+    def _wait(self):
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _captured_history(self, ticker, interval):
+        key = (ticker, interval)
+        with self._lock:
+            if key not in self._histories:
+                path = os.path.join(self.capture_dir, 'history', f"{_capture_name(ticker)}_{interval}.pkl")
+                self._histories[key] = pd.read_pickle(path) if os.path.exists(path) else None
+            return self._histories[key]
+
+    def _slice(self, hist, period, start):
+        if hist is None or hist.empty:
+            return pd.DataFrame()
+        dates = hist.index.strftime('%Y-%m-%d')
+        if start is not None:
+            first = pd.Timestamp(start).strftime('%Y-%m-%d')
+        else:
+            first = period_start(period, now=hist.index[-1].strftime('%Y-%m-%d')).strftime('%Y-%m-%d')
+        return hist[dates >= first]
+
+    def history(self, ticker, period='1y', interval='1d', start=None):
+        self._wait()
+        return self._slice(self._captured_history(ticker, interval), period, start)
+
+    def histories(self, tickers, period='1y', start=None):
+        """All tickers in one simulated request, like the batched yfinance download"""
+        self._wait()
+        histories = {}
+        for ticker in dict.fromkeys(tickers):
+            hist = self._slice(self._captured_history(ticker, '1d'), period, start)
+            if not hist.empty:
+                histories[ticker] = hist
+        return histories
+
+    def info(self, ticker):
+        self._wait()
+        path = os.path.join(self.capture_dir, 'info', f"{_capture_name(ticker)}.json")
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+
+def provider_from_env():
+    """Build the provider MERCATO_PROVIDER asks for"""
+    name = os.environ.get('MERCATO_PROVIDER', 'yfinance')
+    if name == 'record':
+        return RecordingProvider(YFinanceProvider())
+    if name == 'replay':
+        return ReplayProvider(latency=float(os.environ.get('MERCATO_REPLAY_LATENCY', 0)))
+    if name == 'yfinance':
+        return YFinanceProvider()
+    raise ValueError(f"Unknown MERCATO_PROVIDER: {name}")
+
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def get_provider():
+    """The process-wide market data provider"""
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            _provider = provider_from_env()
+        return _provider
+
+
+def set_provider(provider):
+    """Swap the process-wide provider, e.g. for a replay in a benchmark"""
+    global _provider
+    with _provider_lock:
+        _provider = provider
@@ -0,0 +1,598 @@
+"""
+Mercato scoring
+The five 0-20 sub-scores behind a stock's Mercato score, per stock and
+vectorized across many stocks at once
+"""
+
+import numpy as np
+import pandas as pd
+
+from mercato_data import benchmark_for, get_benchmark_history, get_stock_data
+from mercato_metrics import timed
+from mercato_percentiles import read_percentile_tables
+
+
+# ============ SCORING FUNCTIONS ============
+
+@timed('scoring.calculate_financial_health')
+def calculate_financial_health(data):
+    scores = []
+    debt_ratio = data['total_debt'] / data['market_cap'] if data['market_cap'] > 0 else 1
+    if debt_ratio < 0.2:
+        debt_score = 1.0
+    elif debt_ratio < 0.5:
+        debt_score = 0.85
+    elif debt_ratio < 0.8:
+        debt_score = 0.65
+    else:
+        debt_score = 0.4
+    scores.append(debt_score)
+    
+    cash_ratio = data['total_cash'] / data['market_cap'] if data['market_cap'] > 0 else 0
+    cash_score = min(1.0, cash_ratio * 5 + 0.3)
+    scores.append(cash_score)
+    
+    fcf_ratio = data['free_cash_flow'] / data['market_cap'] if data['market_cap'] > 0 else 0
+    if fcf_ratio > 0.05:
+        fcf_score = 0.9
+    elif fcf_ratio > 0:
+        fcf_score = 0.7
+    else:
+        fcf_score = 0.4
+    scores.append(fcf_score)
+    
+    return np.mean(scores) * 20
+
+
+@timed('scoring.calculate_profitability')
+def calculate_profitability(data):
+    scores = []
+    pm = data['profit_margin']
+    if pm > 0.30:  # Exceptional - very few companies
+        pm_score = 1.0
+    elif pm > 0.20:  # Great
+        pm_score = 0.75
+    elif pm > 0.12:  # Good
+        pm_score = 0.55
+    elif pm > 0.06:  # Average
+        pm_score = 0.35
+    else:
+        pm_score = max(0.15, pm * 3)
+    scores.append(pm_score)
+    
+    om = data['operating_margin']
+    if om > 0.35:  # Exceptional
+        om_score = 1.0
+    elif om > 0.25:  # Great
+        om_score = 0.75
+    elif om > 0.15:  # Good
+        om_score = 0.55
+    elif om > 0.08:  # Average
+        om_score = 0.35
+    else:
+        om_score = max(0.15, om * 2.5)
+    scores.append(om_score)
+    
+    roe = data['roe']
+    if roe > 0.25:  # Exceptional
+        roe_score = 1.0
+    elif roe > 0.18:  # Great
+        roe_score = 0.75
+    elif roe > 0.12:  # Good
+        roe_score = 0.55
+    elif roe > 0.06:  # Average
+        roe_score = 0.35
+    else:
+        roe_score = max(0.15, roe * 2.5)
+    scores.append(roe_score)
+    
+    return np.mean(scores) * 20
+
+
+@timed('scoring.calculate_growth')
+def calculate_growth(data):
+    scores = []
+    rev = data['revenue_growth']
+    if rev > 0.2:
+        rev_score = 1.0
+    elif rev > 0.1:
+        rev_score = 0.8
+    elif rev > 0.05:
+        rev_score = 0.65
+    elif rev > 0:
+        rev_score = 0.5
+    else:
+        rev_score = 0.35
+    scores.append(rev_score)
+    
+    earn = data['earnings_growth']
+    if earn > 0.2:
+        earn_score = 1.0
+    elif earn > 0.1:
+        earn_score = 0.8
+    elif earn > 0.05:
+        earn_score = 0.65
+    elif earn > 0:
+        earn_score = 0.5
+    else:
+        earn_score = 0.35
+    scores.append(earn_score)
+    
+    scores.append(0.65)
+    return np.mean(scores) * 20
+
+
+@timed('scoring.calculate_momentum')
+def calculate_momentum(data):
+    try:
+        hist = data['hist']
+        if hist is None or hist.empty:
+            return 12.0
+        
+        scores = []
+        bench_close = get_benchmark_history(benchmark_for(data.get('sector')))
+        
+        # 1-month momentum - more balanced
+        if len(hist) >= 21:
+            stock_1m = (hist['Close'].iloc[-1] / hist['Close'].iloc[-21] - 1)
+            bench_1m = (bench_close.iloc[-1] / bench_close.iloc[-21] - 1)
+            rel_momentum = stock_1m - bench_1m
+            
+            if rel_momentum > 0.08:
+                score_1m = 1.0
+            elif rel_momentum > 0.03:
+                score_1m = 0.85
+            elif rel_momentum > -0.02:
+                score_1m = 0.7
+            elif rel_momentum > -0.06:
+                score_1m = 0.55
+            else:
+                score_1m = 0.4
+            scores.append(score_1m)
+        
+        # 3-month momentum - more balanced
+        if len(hist) >= 63:
+            stock_3m = (hist['Close'].iloc[-1] / hist['Close'].iloc[-63] - 1)
+            bench_3m = (bench_close.iloc[-1] / bench_close.iloc[-63] - 1)
+            rel_momentum = stock_3m - bench_3m
+            
+            if rel_momentum > 0.15:
+                score_3m = 1.0
+            elif rel_momentum > 0.05:
+                score_3m = 0.85
+            elif rel_momentum > -0.05:
+                score_3m = 0.7
+            elif rel_momentum > -0.12:
+                score_3m = 0.55
+            else:
+                score_3m = 0.4
+            scores.append(score_3m)
+        
+        return np.mean(scores) * 20 if scores else 12.0
+    except:
+        return 12.0
+
+
+@timed('scoring.calculate_stability')
+def calculate_stability(data):
+    scores = []
+    
+    # Beta scoring - more generous
+    beta = data['beta']
+    if beta < 0.7:
+        beta_score = 1.0
+    elif beta < 1.0:
+        beta_score = 0.85
+    elif beta < 1.3:
+        beta_score = 0.7
+    elif beta < 1.6:
+        beta_score = 0.55
+    else:
+        beta_score = 0.4
+    scores.append(beta_score)
+    
+    # 52-week range volatility - more balanced
+    high = data['fifty_two_week_high']
+    low = data['fifty_two_week_low']
+    price = data['price']
+    
+    if high > 0 and low > 0 and price > 0:
+        vol_range = (high - low) / low
+        if vol_range < 0.25:
+            vol_score = 1.0
+        elif vol_range < 0.4:
+            vol_score = 0.85
+        elif vol_range < 0.6:
+            vol_score = 0.7
+        elif vol_range < 0.85:
+            vol_score = 0.55
+        else:
+            vol_score = 0.4
+        scores.append(vol_score)
+    
+    # Drawdown - more forgiving
+    try:
+        hist = data['hist']
+        if hist is not None and not hist.empty:
+            rolling_max = hist['Close'].expanding().max()
+            drawdown = (hist['Close'] - rolling_max) / rolling_max
+            max_dd = abs(drawdown.min())
+            
+            if max_dd < 0.12:
+                dd_score = 1.0
+            elif max_dd < 0.20:
+                dd_score = 0.85
+            elif max_dd < 0.30:
+                dd_score = 0.7
+            elif max_dd < 0.45:
+                dd_score = 0.55
+            else:
+                dd_score = 0.4
+            scores.append(dd_score)
+    except:
+        scores.append(0.7)
+    
+    return np.mean(scores) * 20
+
+
+@timed('scoring.score_stock', per_ticker=True)
+def score_stock(ticker, data=None):
+    if data is None:
+        data = get_stock_data(ticker)
+    
+    if data is None:
+        return None
+    
+    financial_health = calculate_financial_health(data)
+    profitability = calculate_profitability(data)
+    growth = calculate_growth(data)
+    momentum = calculate_momentum(data)
+    stability = calculate_stability(data)
+    
+    final_score = financial_health + profitability + growth + momentum + stability
+    price_change = ((data['price'] - data['prev_close']) / data['prev_close']) * 100
+    
+    return {
+        'ticker': ticker,
+        'company_name': data['company_name'],
+        'logo_url': data['logo_url'],
+        'sector': data['sector'],
+        'price': data['price'],
+        'price_change': price_change,
+        'financial_health': round(financial_health, 1),
+        'profitability': round(profitability, 1),
+        'growth': round(growth, 1),
+        'momentum': round(momentum, 1),
+        'stability': round(stability, 1),
+        'final_score': round(final_score, 1),
+        'hist': data['hist']
+    }
+
+
+@timed('scoring.calculate_portfolio_score')
+def calculate_portfolio_score(stock_scores, analytics=None):
+    """0-100 portfolio health: the average score, adjusted for diversification and stability
+    
+    With analyze_portfolio results the scores are value-weighted and
+    diversification counts effective bets instead of sectors.
+    """
+    if not stock_scores:
+        return 0
+    
+    avg_score = np.mean([s['final_score'] for s in stock_scores])
+    weighted_stability = np.mean([s['stability'] for s in stock_scores])
+    
+    sectors = set(s['sector'] for s in stock_scores)
+    num_sectors = len(sectors)
+    if analytics is not None:
+        avg_score = analytics['weighted_score']
+        weighted_stability = analytics['weighted_stability']
+        if analytics['effective_bets'] is not None:
+            num_sectors = analytics['effective_bets']
+    if num_sectors <= 1:
+        div_adj = 0.88
+    elif num_sectors >= 5:
+        div_adj = 1.0
+    else:
+        div_adj = 0.88 + (num_sectors - 1) * 0.03
+    
+    stab_adj = 0.92 + (weighted_stability / 20) * 0.08
+    
+    portfolio_score = avg_score * div_adj * stab_adj
+    
+    return round(portfolio_score, 1)
+
+
+@timed('scoring.generate_insights')
+def generate_insights(stock_scores):
+    insights = []
+    
+    if not stock_scores:
+        return insights
+    
+    sorted_stocks = sorted(stock_scores, key=lambda x: x['final_score'], reverse=True)
+    best = sorted_stocks[0]
+    worst = sorted_stocks[-1]
+    
+    insights.append(f"Top performer: {best['company_name']} ({best['final_score']}/100)")
+    
+    if len(stock_scores) > 1:
+        insights.append(f"Needs attention: {worst['company_name']} ({worst['final_score']}/100)")
+    
+    avg_momentum = np.mean([s['momentum'] for s in stock_scores])
+    if avg_momentum > 15:
+        insights.append(f"Strong momentum across portfolio")
+    elif avg_momentum < 8:
+        insights.append(f"Weak momentum detected")
+    
+    positive_movers = sum(1 for s in stock_scores if s['price_change'] > 0)
+    if positive_movers > len(stock_scores) / 2:
+        insights.append(f"{positive_movers} of {len(stock_scores)} stocks gained today")
+    
+    return insights
+
+
+# ============ VECTORIZED SCORING ============
+# The threshold tables below are the calculate_* ladders above, applied to
+# whole columns at once. score_frame must reproduce score_stock exactly, so
+# any change to a ladder has to be made in both places.
+
+FRAME_COLUMNS = [
+    'total_debt', 'total_cash', 'free_cash_flow', 'market_cap',
+    'profit_margin', 'operating_margin', 'roe',
+    'revenue_growth', 'earnings_growth', 'beta',
+    'fifty_two_week_high', 'fifty_two_week_low', 'price', 'prev_close'
+]
+PRICE_FEATURE_COLUMNS = [
+    'bars', 'return_1m', 'return_3m', 'bench_return_1m', 'bench_return_3m',
+    'relative_return_1m', 'relative_return_3m', 'max_drawdown', 'volatility'
+]
+SCORE_COLUMNS = ['financial_health', 'profitability', 'growth', 'momentum', 'stability', 'final_score']
+
+LADDER_SCORES = [1.0, 0.85, 0.7, 0.55]
+TRADING_DAYS = 252
+
+
+def _above(x, cutoffs, values, default):
+    """First value whose cutoff x exceeds, like an if/elif chain of x > cutoff"""
+    return np.select([x > cutoff for cutoff in cutoffs], values, default)
+
+
+def _below(x, cutoffs, values, default):
+    """First value whose cutoff x is under, like an if/elif chain of x < cutoff"""
+    return np.select([x < cutoff for cutoff in cutoffs], values, default)
+
+
+def _round1(x):
+    """round(v, 1) for every element, as score_stock rounds
+
+    np.round scales by ten and rounds half to even, which can land on the
+    other side of a tie than Python's correctly rounded round().
+    """
+    return np.array([round(v, 1) for v in x.tolist()], dtype=float)
+
+
+def close_matrix(closes):
+    """Stack close-price arrays into one (tickers, bars) matrix aligned on the latest bar
+
+    Shorter histories are NaN-padded on the left, so column -k holds every
+    row's k-th most recent close, like the iloc lookups in calculate_momentum.
+    Returns the matrix and each row's bar count.
+    """
+    closes = [np.asarray(c, dtype=float) for c in closes]
+    bars = np.array([len(c) for c in closes], dtype=int)
+    matrix = np.full((len(closes), bars.max(initial=0)), np.nan)
+    for row, values in zip(matrix, closes):
+        if len(values):
+            row[-len(values):] = values
+    return matrix, bars
+
+
+def _trailing_returns(closes, bars, days):
+    if closes.shape[1] < days:
+        return np.full(len(closes), np.nan)
+    return np.where(bars >= days, closes[:, -1] / closes[:, -days] - 1, np.nan)
+
+
+def returns_kernel(closes, bars, bench_closes, bench_bars, bench_rows):
+    """Momentum and risk measures for every row of a close_matrix in one pass
+
+    bench_closes and bench_bars are a close_matrix of the benchmarks and
+    bench_rows picks each stock's benchmark row. Gives 21- and 63-day
+    returns for the stocks and their benchmarks, the returns relative to
+    the benchmark, the max drawdown from the running high and annualized
+    realized volatility, each NaN where the history is too short.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        features = {'bars': bars}
+        for name, days in [('1m', 21), ('3m', 63)]:
+            stock = _trailing_returns(closes, bars, days)
+            bench = _trailing_returns(bench_closes, bench_bars, days)[bench_rows]
+            features[f'return_{name}'] = stock
+            features[f'bench_return_{name}'] = bench
+            features[f'relative_return_{name}'] = stock - bench
+
+        # Padding holds the running max at -inf and is skipped by the min
+        padding = np.arange(closes.shape[1]) < closes.shape[1] - bars[:, None]
+        running_max = np.maximum.accumulate(np.where(padding, -np.inf, closes), axis=1)
+        drawdowns = np.where(padding, np.inf, (closes - running_max) / running_max)
+        features['max_drawdown'] = np.where(bars > 0, np.abs(drawdowns.min(axis=1, initial=np.inf)), np.nan)
+
+        daily = closes[:, 1:] / closes[:, :-1] - 1
+        count = np.maximum(bars - 1, 0)
+        mean = np.nansum(daily, axis=1) / count
+        variance = np.nansum((daily - mean[:, None]) ** 2, axis=1) / (count - 1)
+        features['volatility'] = np.where(count >= 2, np.sqrt(variance * TRADING_DAYS), np.nan)
+    return features
+
+
+def price_features(stock_data):
+    """The price-history inputs score_frame needs, for every stock at once
+
+    Closes and benchmark closes go through returns_kernel as two matrices,
+    so the cost barely grows with the number of stocks.
+    """
+    benchmarks = {}
+    symbols = []
+    for data in stock_data.values():
+        symbol = benchmark_for(data.get('sector'))
+        if symbol not in benchmarks:
+            try:
+                benchmarks[symbol] = get_benchmark_history(symbol)
+            except Exception:
+                benchmarks[symbol] = None
+        symbols.append(symbol)
+
+    closes, bars = close_matrix(
+        data['hist'].close if data.get('hist') is not None else () for data in stock_data.values()
+    )
+    bench_closes, bench_bars = close_matrix(
+        bench.to_numpy(dtype=float) if bench is not None else () for bench in benchmarks.values()
+    )
+    rows = {symbol: row for row, symbol in enumerate(benchmarks)}
+    bench_rows = np.array([rows[symbol] for symbol in symbols], dtype=int)
+    return returns_kernel(closes, bars, bench_closes, bench_bars, bench_rows)
+
+
+def stock_frame(stock_data):
+    """One row per ticker of everything score_frame reads, from build_stock_data dicts"""
+    frame = pd.DataFrame.from_dict(
+        {ticker: {col: data.get(col) for col in FRAME_COLUMNS} for ticker, data in stock_data.items()},
+        orient='index', columns=FRAME_COLUMNS
+    )
+    features = price_features(stock_data)
+    for col in PRICE_FEATURE_COLUMNS:
+        frame[col] = features[col]
+    return frame
+
+
+@timed('scoring.score_frame')
+def score_frame(frame):
+    """Score every row of a stock_frame at once
+
+    Returns the five sub-scores, final_score (rounded like score_stock) and
+    the unrounded price_change, indexed like frame.
+    """
+    col = {name: pd.to_numeric(frame[name], errors='coerce').to_numpy(dtype=float)
+           for name in FRAME_COLUMNS + PRICE_FEATURE_COLUMNS}
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Financial health
+        market_cap = col['market_cap']
+        has_cap = market_cap > 0
+        debt_ratio = np.where(has_cap, col['total_debt'] / market_cap, 1)
+        cash_ratio = np.where(has_cap, col['total_cash'] / market_cap, 0)
+        fcf_ratio = np.where(has_cap, col['free_cash_flow'] / market_cap, 0)
+        debt_score = _below(debt_ratio, [0.2, 0.5, 0.8], [1.0, 0.85, 0.65], 0.4)
+        cash_score = np.fmin(1.0, cash_ratio * 5 + 0.3)
+        fcf_score = _above(fcf_ratio, [0.05, 0], [0.9, 0.7], 0.4)
+        financial_health = (debt_score + cash_score + fcf_score) / 3 * 20
+
+        # Profitability
+        pm, om, roe = col['profit_margin'], col['operating_margin'], col['roe']
+        tiers = [1.0, 0.75, 0.55, 0.35]
+        pm_score = _above(pm, [0.30, 0.20, 0.12, 0.06], tiers, np.fmax(0.15, pm * 3))
+        om_score = _above(om, [0.35, 0.25, 0.15, 0.08], tiers, np.fmax(0.15, om * 2.5))
+        roe_score = _above(roe, [0.25, 0.18, 0.12, 0.06], tiers, np.fmax(0.15, roe * 2.5))
+        profitability = (pm_score + om_score + roe_score) / 3 * 20
+
+        # Growth
+        tiers = [1.0, 0.8, 0.65, 0.5]
+        rev_score = _above(col['revenue_growth'], [0.2, 0.1, 0.05, 0], tiers, 0.35)
+        earn_score = _above(col['earnings_growth'], [0.2, 0.1, 0.05, 0], tiers, 0.35)
+        growth = (rev_score + earn_score + 0.65) / 3 * 20
+
+        # Momentum, relative to each stock's benchmark. calculate_momentum
+        # falls back to 12 when the benchmark is too short for a window the
+        # stock itself covers, so mirror that here.
+        bars = col['bars']
+        has_1m, has_3m = bars >= 21, bars >= 63
+        score_1m = _above(col['relative_return_1m'], [0.08, 0.03, -0.02, -0.06], LADDER_SCORES, 0.4)
+        score_3m = _above(col['relative_return_3m'], [0.15, 0.05, -0.05, -0.12], LADDER_SCORES, 0.4)
+        momentum_count = has_1m.astype(int) + has_3m
+        momentum_failed = (has_1m & np.isnan(col['bench_return_1m'])) | (has_3m & np.isnan(col['bench_return_3m']))
+        momentum = np.where(
+            (momentum_count > 0) & ~momentum_failed,
+            (np.where(has_1m, score_1m, 0) + np.where(has_3m, score_3m, 0)) / momentum_count * 20,
+            12.0
+        )
+
+        # Stability
+        high, low, price = col['fifty_two_week_high'], col['fifty_two_week_low'], col['price']
+        beta_score = _below(col['beta'], [0.7, 1.0, 1.3, 1.6], LADDER_SCORES, 0.4)
+        has_range = (high > 0) & (low > 0) & (price > 0)
+        vol_score = _below((high - low) / low, [0.25, 0.4, 0.6, 0.85], LADDER_SCORES, 0.4)
+        has_drawdown = bars > 0
+        dd_score = _below(col['max_drawdown'], [0.12, 0.20, 0.30, 0.45], LADDER_SCORES, 0.4)
+        stability = (
+            (beta_score + np.where(has_range, vol_score, 0) + np.where(has_drawdown, dd_score, 0))
+            / (1 + has_range.astype(int) + has_drawdown) * 20
+        )
+
+        final_score = financial_health + profitability + growth + momentum + stability
+        price_change = ((price - col['prev_close']) / col['prev_close']) * 100
+
+    return pd.DataFrame({
+        'financial_health': _round1(financial_health),
+        'profitability': _round1(profitability),
+        'growth': _round1(growth),
+        'momentum': _round1(momentum),
+        'stability': _round1(stability),
+        'final_score': _round1(final_score),
+        'price_change': price_change
+    }, index=frame.index)
+
+
+@timed('scoring.score_stocks')
+def score_stocks(stock_data, percentiles=None):
+    """Score many stocks in one pass, returning score_stock-style dicts in input order
+
+    When percentile tables are available (the saved ones unless percentiles
+    is given), each result also carries its PEER_COLUMNS scores.
+    """
+    if not stock_data:
+        return []
+
+    frame = stock_frame(stock_data)
+    scores = score_frame(frame)
+    tables = percentiles or read_percentile_tables()
+    peers = None
+    if tables is not None:
+        peers = tables.score(frame, [data.get('sector') for data in stock_data.values()])
+    results = []
+    for i, (ticker, data) in enumerate(stock_data.items()):
+        row = scores.loc[ticker]
+        result = {
+            'ticker': ticker,
+            'company_name': data['company_name'],
+            'logo_url': data['logo_url'],
+            'sector': data['sector'],
+            'price': data['price'],
+            'price_change': row['price_change']
+        }
+        result.update({col: row[col] for col in SCORE_COLUMNS})
+        if peers is not None:
+            result.update({col: float(values[i]) for col, values in peers.items()})
+        result['hist'] = data['hist']
+        results.append(result)
+    return results
+
+
+@timed('scoring.rescore_stocks')
+def rescore_stocks(stock_scores, stock_data, tickers):
+    """Bring a list of score_stocks results up to date in place
+
+    stock_data holds only the tickers whose inputs changed (see
+    refresh_stock_data). They are scored in one vectorized pass and every
+    other score is kept as it is, so a refresh where nothing moved does no
+    scoring at all. Scores for tickers no longer in tickers are dropped and
+    the list ends up in tickers order.
+    """
+    by_ticker = {score['ticker']: score for score in stock_scores}
+    for score in score_stocks(stock_data):
+        if score['ticker'] in by_ticker:
+            by_ticker[score['ticker']].update(score)
+        else:
+            by_ticker[score['ticker']] = score
+    stock_scores[:] = [by_ticker[t] for t in dict.fromkeys(tickers) if t in by_ticker]
+    return stock_scores
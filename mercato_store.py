@@ -0,0 +1,391 @@
+"""
+Mercato local storage
+On-disk SQLite stores for daily price history and company fundamentals,
+so refreshes only download what has actually changed, plus backfilled
+daily scores and the saved portfolios behind the HTTP API
+"""
+
+import json
+import os
+import sqlite3
+import time
+from contextlib import closing
+
+import numpy as np
+import pandas as pd
+
+DATA_DIR = os.environ.get('MERCATO_DATA_DIR', '.mercato')
+PRICE_DB = os.path.join(DATA_DIR, 'prices.sqlite')
+FUNDAMENTALS_DB = os.path.join(DATA_DIR, 'fundamentals.sqlite')
+PORTFOLIO_DB = os.path.join(DATA_DIR, 'portfolios.sqlite')
+SCORES_DB = os.path.join(DATA_DIR, 'scores.sqlite')
+
+PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume', 'Dividends', 'Stock Splits']
+SCORE_HISTORY_COLUMNS = ['financial_health', 'profitability', 'growth', 'momentum', 'stability', 'final_score']
+
+
+def connect(path):
+    """Open a SQLite connection, creating the data directory if needed"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute('PRAGMA journal_mode=WAL')
+    return conn
+
+
+class PriceStore:
+    """Daily OHLCV bars keyed by (ticker, date)
+
+    Each ticker also records the index timezone yfinance returned and when it
+    was last refreshed from the network.
+    """
+
+    def __init__(self, path=PRICE_DB):
+        self.path = path
+        with closing(connect(self.path)) as conn, conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS prices (
+                    ticker TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    open REAL, high REAL, low REAL, close REAL,
+                    volume REAL, dividends REAL, splits REAL,
+                    PRIMARY KEY (ticker, date)
+                ) WITHOUT ROWID
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS tickers (
+                    ticker TEXT PRIMARY KEY,
+                    tz TEXT,
+                    refreshed_at REAL
+                )
+            ''')
+
+    def last_dates(self, tickers):
+        """Most recent stored bar date per ticker, for tickers that have any"""
+        tickers = list(tickers)
+        if not tickers:
+            return {}
+        placeholders = ','.join('?' * len(tickers))
+        with closing(connect(self.path)) as conn:
+            rows = conn.execute(
+                f'SELECT ticker, MAX(date) FROM prices WHERE ticker IN ({placeholders}) GROUP BY ticker',
+                tickers
+            ).fetchall()
+        return {ticker: pd.Timestamp(date) for ticker, date in rows}
+
+    def first_dates(self, tickers):
+        """Earliest stored bar date per ticker, for tickers that have any"""
+        tickers = list(tickers)
+        if not tickers:
+            return {}
+        placeholders = ','.join('?' * len(tickers))
+        with closing(connect(self.path)) as conn:
+            rows = conn.execute(
+                f'SELECT ticker, MIN(date) FROM prices WHERE ticker IN ({placeholders}) GROUP BY ticker',
+                tickers
+            ).fetchall()
+        return {ticker: pd.Timestamp(date) for ticker, date in rows}
+
+    def refreshed_at(self, tickers):
+        """Unix time each ticker was last refreshed from the network"""
+        tickers = list(tickers)
+        if not tickers:
+            return {}
+        placeholders = ','.join('?' * len(tickers))
+        with closing(connect(self.path)) as conn:
+            rows = conn.execute(
+                f'SELECT ticker, refreshed_at FROM tickers WHERE ticker IN ({placeholders})',
+                tickers
+            ).fetchall()
+        return {ticker: ts for ticker, ts in rows if ts is not None}
+
+    def write(self, ticker, hist, replace=False):
+        """Insert or overwrite bars for a ticker and mark it refreshed
+
+        With replace=True the ticker's existing bars are dropped first, which
+        is needed when a split or dividend re-adjusts its whole history.
+        """
+        tz = str(hist.index.tz) if hist.index.tz is not None else None
+        rows = [
+            (ticker, date, *values)
+            for date, values in zip(
+                hist.index.strftime('%Y-%m-%d'),
+                hist.reindex(columns=PRICE_COLUMNS).fillna(0.0).itertuples(index=False, name=None)
+            )
+        ]
+        with closing(connect(self.path)) as conn, conn:
+            if replace:
+                conn.execute('DELETE FROM prices WHERE ticker = ?', (ticker,))
+            conn.executemany('INSERT OR REPLACE INTO prices VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+            conn.execute(
+                'INSERT INTO tickers VALUES (?, ?, ?) '
+                'ON CONFLICT(ticker) DO UPDATE SET tz = COALESCE(excluded.tz, tz), refreshed_at = excluded.refreshed_at',
+                (ticker, tz, time.time())
+            )
+
+    def touch(self, ticker):
+        """Mark a ticker refreshed without new bars (e.g. on a market holiday)"""
+        with closing(connect(self.path)) as conn, conn:
+            conn.execute('UPDATE tickers SET refreshed_at = ? WHERE ticker = ?', (time.time(), ticker))
+
+    def read(self, ticker, start=None):
+        """Stored bars for a ticker from start onwards, shaped like Ticker.history()"""
+        query = 'SELECT date, open, high, low, close, volume, dividends, splits FROM prices WHERE ticker = ?'
+        params = [ticker]
+        if start is not None:
+            query += ' AND date >= ?'
+            params.append(pd.Timestamp(start).strftime('%Y-%m-%d'))
+        query += ' ORDER BY date'
+
+        with closing(connect(self.path)) as conn:
+            rows = conn.execute(query, params).fetchall()
+            tz_row = conn.execute('SELECT tz FROM tickers WHERE ticker = ?', (ticker,)).fetchone()
+
+        hist = pd.DataFrame([row[1:] for row in rows], columns=PRICE_COLUMNS)
+        index = pd.DatetimeIndex(pd.to_datetime([row[0] for row in rows]), name='Date')
+        if tz_row and tz_row[0]:
+            index = index.tz_localize(tz_row[0])
+        hist.index = index
+        return hist
+
+    def read_columns(self, tickers, start=None):
+        """Stored bars for many tickers in one query, as {ticker: (tz, dates, bars)}
+
+        dates is a datetime64 array and bars an (n, 5) float array of open,
+        high, low, close and volume, for readers that don't need a DataFrame.
+        """
+        tickers = list(dict.fromkeys(tickers))
+        if not tickers:
+            return {}
+        placeholders = ','.join('?' * len(tickers))
+        query = f'SELECT ticker, date, open, high, low, close, volume FROM prices WHERE ticker IN ({placeholders})'
+        params = list(tickers)
+        if start is not None:
+            query += ' AND date >= ?'
+            params.append(pd.Timestamp(start).strftime('%Y-%m-%d'))
+        query += ' ORDER BY ticker, date'
+
+        with closing(connect(self.path)) as conn:
+            rows = conn.execute(query, params).fetchall()
+            zones = dict(conn.execute(f'SELECT ticker, tz FROM tickers WHERE ticker IN ({placeholders})', tickers).fetchall())
+        if not rows:
+            return {}
+
+        names, dates, *columns = zip(*rows)
+        names = np.array(names)
+        dates = np.array(dates, dtype='datetime64[ns]')
+        bars = np.column_stack(columns).astype(float)
+        starts = np.flatnonzero(np.r_[True, names[1:] != names[:-1]])
+        ends = np.r_[starts[1:], len(names)]
+        return {
+            names[i]: (zones.get(names[i]), dates[i:j], bars[i:j])
+            for i, j in zip(starts, ends)
+        }
+
+
+class FundamentalsStore:
+    """The subset of stock.info the scorers use, keyed by ticker with its fetch time"""
+
+    def __init__(self, path=FUNDAMENTALS_DB):
+        self.path = path
+        with closing(connect(self.path)) as conn, conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS fundamentals (
+                    ticker TEXT PRIMARY KEY,
+                    info TEXT NOT NULL,
+                    fetched_at REAL NOT NULL
+                )
+            ''')
+
+    def read(self, tickers):
+        """Stored (info, fetched_at) per ticker, for tickers that have an entry"""
+        tickers = list(tickers)
+        if not tickers:
+            return {}
+        placeholders = ','.join('?' * len(tickers))
+        with closing(connect(self.path)) as conn:
+            rows = conn.execute(
+                f'SELECT ticker, info, fetched_at FROM fundamentals WHERE ticker IN ({placeholders})',
+                tickers
+            ).fetchall()
+        return {ticker: (json.loads(info), fetched_at) for ticker, info, fetched_at in rows}
+
+    def write(self, ticker, info):
+        with closing(connect(self.path)) as conn, conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO fundamentals VALUES (?, ?, ?)',
+                (ticker, json.dumps(info), time.time())
+            )
+
+    def invalidate(self, tickers=None):
+        """Expire stored fundamentals for tickers, or for everything if tickers is None
+
+        Entries are kept, so they can still be served if the refetch fails.
+        """
+        with closing(connect(self.path)) as conn, conn:
+            if tickers is None:
+                conn.execute('UPDATE fundamentals SET fetched_at = 0')
+            else:
+                conn.executemany('UPDATE fundamentals SET fetched_at = 0 WHERE ticker = ?', [(t,) for t in tickers])
+
+
+class ScoreHistoryStore:
+    """Daily sub-scores and final score keyed by (ticker, date), one column per score"""
+
+    def __init__(self, path=SCORES_DB):
+        self.path = path
+        with closing(connect(self.path)) as conn, conn:
+            conn.execute(f'''
+                CREATE TABLE IF NOT EXISTS scores (
+                    ticker TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    {', '.join(f'{col} REAL' for col in SCORE_HISTORY_COLUMNS)},
+                    PRIMARY KEY (ticker, date)
+                ) WITHOUT ROWID
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS scored_through (
+                    ticker TEXT PRIMARY KEY,
+                    date TEXT NOT NULL
+                )
+            ''')
+
+    def last_dates(self, tickers):
+        """Most recent scored date per ticker, for tickers that have any"""
+        tickers = list(tickers)
+        if not tickers:
+            return {}
+        placeholders = ','.join('?' * len(tickers))
+        with closing(connect(self.path)) as conn:
+            rows = conn.execute(
+                f'SELECT ticker, MAX(date) FROM scores WHERE ticker IN ({placeholders}) GROUP BY ticker',
+                tickers
+            ).fetchall()
+        return {ticker: pd.Timestamp(date) for ticker, date in rows}
+
+    def scored_through(self, tickers):
+        """Last bar date each ticker was backfilled through, even if no day had enough bars to score"""
+        tickers = list(tickers)
+        if not tickers:
+            return {}
+        placeholders = ','.join('?' * len(tickers))
+        with closing(connect(self.path)) as conn:
+            rows = conn.execute(
+                f'SELECT ticker, date FROM scored_through WHERE ticker IN ({placeholders})', tickers
+            ).fetchall()
+        return {ticker: pd.Timestamp(date) for ticker, date in rows}
+
+    def write(self, scores, through=None):
+        """Insert or overwrite daily scores from {ticker: DataFrame} in one transaction
+
+        Each frame is indexed by date with SCORE_HISTORY_COLUMNS. through maps
+        tickers to the last bar date their backfill covered.
+        """
+        rows = [
+            (ticker, date, *values)
+            for ticker, frame in scores.items()
+            for date, values in zip(
+                frame.index.strftime('%Y-%m-%d'),
+                frame[SCORE_HISTORY_COLUMNS].itertuples(index=False, name=None)
+            )
+        ]
+        placeholders = ', '.join('?' * (len(SCORE_HISTORY_COLUMNS) + 2))
+        with closing(connect(self.path)) as conn, conn:
+            conn.executemany(f'INSERT OR REPLACE INTO scores VALUES ({placeholders})', rows)
+            conn.executemany(
+                'INSERT OR REPLACE INTO scored_through VALUES (?, ?)',
+                [(ticker, pd.Timestamp(date).strftime('%Y-%m-%d')) for ticker, date in (through or {}).items()]
+            )
+
+    def read(self, ticker, start=None):
+        """Stored daily scores for a ticker from start onwards, indexed by date"""
+        query = f'SELECT date, {", ".join(SCORE_HISTORY_COLUMNS)} FROM scores WHERE ticker = ?'
+        params = [ticker]
+        if start is not None:
+            query += ' AND date >= ?'
+            params.append(pd.Timestamp(start).strftime('%Y-%m-%d'))
+        query += ' ORDER BY date'
+
+        with closing(connect(self.path)) as conn:
+            rows = conn.execute(query, params).fetchall()
+        scores = pd.DataFrame([row[1:] for row in rows], columns=SCORE_HISTORY_COLUMNS)
+        scores.index = pd.DatetimeIndex(pd.to_datetime([row[0] for row in rows]), name='Date')
+        return scores
+
+    def read_columns(self, tickers):
+        """Stored scores for many tickers in one query, as {ticker: (dates, scores)}
+
+        dates is a datetime64 array and scores an (n, 6) float array of
+        SCORE_HISTORY_COLUMNS.
+        """
+        tickers = list(dict.fromkeys(tickers))
+        if not tickers:
+            return {}
+        placeholders = ','.join('?' * len(tickers))
+        with closing(connect(self.path)) as conn:
+            rows = conn.execute(
+                f'SELECT ticker, date, {", ".join(SCORE_HISTORY_COLUMNS)} FROM scores '
+                f'WHERE ticker IN ({placeholders}) ORDER BY ticker, date',
+                tickers
+            ).fetchall()
+        if not rows:
+            return {}
+
+        names, dates, *columns = zip(*rows)
+        names = np.array(names)
+        dates = np.array(dates, dtype='datetime64[ns]')
+        scores = np.column_stack(columns).astype(float)
+        starts = np.flatnonzero(np.r_[True, names[1:] != names[:-1]])
+        ends = np.r_[starts[1:], len(names)]
+        return {str(names[i]): (dates[i:j], scores[i:j]) for i, j in zip(starts, ends)}
+
+
+class PortfolioStore:
+    """Each user's holdings as (ticker, shares), in the order they were added"""
+
+    def __init__(self, path=PORTFOLIO_DB):
+        self.path = path
+        with closing(connect(self.path)) as conn, conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS holdings (
+                    user_id TEXT NOT NULL,
+                    ticker TEXT NOT NULL,
+                    shares REAL NOT NULL,
+                    added_at REAL NOT NULL,
+                    PRIMARY KEY (user_id, ticker)
+                )
+            ''')
+
+    def holdings(self, user_id):
+        with closing(connect(self.path)) as conn:
+            rows = conn.execute(
+                'SELECT ticker, shares FROM holdings WHERE user_id = ? ORDER BY added_at',
+                (user_id,)
+            ).fetchall()
+        return dict(rows)
+
+    def add(self, user_id, ticker, shares):
+        """Add a holding; returns False if the user already holds the ticker"""
+        with closing(connect(self.path)) as conn, conn:
+            cursor = conn.execute(
+                'INSERT OR IGNORE INTO holdings VALUES (?, ?, ?, ?)',
+                (user_id, ticker, shares, time.time())
+            )
+            return cursor.rowcount == 1
+
+    def update(self, user_id, ticker, shares):
+        """Change the shares held; returns False if there is no such holding"""
+        with closing(connect(self.path)) as conn, conn:
+            cursor = conn.execute(
+                'UPDATE holdings SET shares = ? WHERE user_id = ? AND ticker = ?',
+                (shares, user_id, ticker)
+            )
+            return cursor.rowcount == 1
+
+    def remove(self, user_id, ticker):
+        """Delete a holding; returns False if there was none"""
+        with closing(connect(self.path)) as conn, conn:
+            cursor = conn.execute(
+                'DELETE FROM holdings WHERE user_id = ? AND ticker = ?',
+                (user_id, ticker)
+            )
+            return cursor.rowcount == 1
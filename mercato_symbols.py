@@ -0,0 +1,213 @@
+"""
+Mercato symbol directory
+Local list of listed US tickers and company names, for instant ticker
+validation and prefix autocomplete without a round trip to Yahoo
+"""
+
+import bisect
+import io
+import os
+import re
+import threading
+import time
+
+import pandas as pd
+import requests
+
+from mercato_data import TTLCache
+from mercato_fetch import get_fetcher
+from mercato_leaderboard import load_sp500_constituents
+from mercato_providers import get_provider
+from mercato_store import DATA_DIR
+
+LISTING_URLS = [
+    'https://www.nasdaqtrader.com/dynamic/SymDir/nasdaqlisted.txt',
+    'https://www.nasdaqtrader.com/dynamic/SymDir/otherlisted.txt'
+]
+LISTINGS_PATH = os.path.join(DATA_DIR, 'listings.csv')
+LISTINGS_TTL = 7 * 24 * 60 * 60
+# An empty directory means the listings couldn't be fetched, so it is retried sooner
+LISTINGS_RETRY = 10 * 60
+
+# Symbols Yahoo had no data for, so repeated typos don't each cost a request
+UNKNOWN_SYMBOL_TTL = 10 * 60
+_unknown_symbols = TTLCache(UNKNOWN_SYMBOL_TTL)
+
+_directory = None
+_directory_building = False
+_directory_lock = threading.Lock()
+
+
+class SymbolDirectory:
+    """Ticker -> company name, with sorted indexes for prefix search
+
+    Tickers are searched by prefix, and company names by the prefix of any
+    word, so 'micro' finds both Microsoft and Advanced Micro Devices.
+    """
+
+    def __init__(self, names=None):
+        self.names = {}
+        self.added = {}
+        self.built_at = time.time()
+        self._tickers = []
+        self._words = []
+        self._lock = threading.Lock()
+        for ticker, name in (names or {}).items():
+            self._insert(ticker, name)
+        self._tickers.sort()
+        self._words.sort()
+
+    def _insert(self, ticker, name):
+        if ticker in self.names:
+            return False
+        self.names[ticker] = name
+        self._tickers.append(ticker)
+        for word in set(re.findall(r'[a-z0-9]+', name.lower())):
+            self._words.append((word, ticker))
+        return True
+
+    def __contains__(self, ticker):
+        return ticker in self.names
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, ticker, name):
+        """Add a symbol found outside the listings, e.g. validated against Yahoo"""
+        with self._lock:
+            if ticker in self.names:
+                return
+            self.names[ticker] = name
+            self.added[ticker] = name
+            bisect.insort(self._tickers, ticker)
+            for word in set(re.findall(r'[a-z0-9]+', name.lower())):
+                bisect.insort(self._words, (word, ticker))
+
+    def search(self, query, limit=8):
+        """(ticker, name) pairs matching query, ticker matches first"""
+        query = query.strip()
+        if not query:
+            return []
+
+        matches = []
+        with self._lock:
+            prefix = query.upper()
+            i = bisect.bisect_left(self._tickers, prefix)
+            while i < len(self._tickers) and self._tickers[i].startswith(prefix) and len(matches) < limit:
+                matches.append(self._tickers[i])
+                i += 1
+
+            prefix = query.lower()
+            i = bisect.bisect_left(self._words, (prefix,))
+            while i < len(self._words) and self._words[i][0].startswith(prefix) and len(matches) < limit:
+                ticker = self._words[i][1]
+                if ticker not in matches:
+                    matches.append(ticker)
+                i += 1
+
+            return [(ticker, self.names[ticker]) for ticker in matches]
+
+
+def _parse_listing(text):
+    """Ticker/name rows from a nasdaqtrader.com pipe-delimited symbol file"""
+    table = pd.read_csv(io.StringIO(text), sep='|', dtype=str, keep_default_na=False)
+    table = table[~table.iloc[:, 0].str.startswith('File Creation Time')]
+    symbol_col = 'Symbol' if 'Symbol' in table.columns else 'ACT Symbol'
+    table = table[(table['Test Issue'] != 'Y') & ~table[symbol_col].str.contains(r'[$]', regex=True)]
+    return pd.DataFrame({
+        # Yahoo writes share classes with a dash (BRK-B)
+        'ticker': table[symbol_col].str.replace('.', '-', regex=False),
+        'name': table['Security Name'].str.split(' - ').str[0].str.strip()
+    })
+
+
+def load_listings():
+    """Exchange-listed US symbols, cached in LISTINGS_PATH and refreshed weekly"""
+    cached = os.path.exists(LISTINGS_PATH)
+    if cached and time.time() - os.path.getmtime(LISTINGS_PATH) < LISTINGS_TTL:
+        return pd.read_csv(LISTINGS_PATH, dtype=str, keep_default_na=False)
+
+    try:
+        frames = []
+        for url in LISTING_URLS:
+            response = requests.get(url, headers={'User-Agent': 'Mercato/1.0'}, timeout=30)
+            response.raise_for_status()
+            frames.append(_parse_listing(response.text))
+        listings = pd.concat(frames, ignore_index=True).drop_duplicates('ticker')
+    except Exception:
+        if cached:
+            return pd.read_csv(LISTINGS_PATH, dtype=str, keep_default_na=False)
+        return pd.DataFrame(columns=['ticker', 'name'])
+
+    os.makedirs(DATA_DIR, exist_ok=True)
+    listings.to_csv(LISTINGS_PATH, index=False)
+    return listings
+
+
+def build_symbol_directory():
+    """A directory seeded from the exchange listings and the S&P 500"""
+    listings = load_listings()
+    names = dict(zip(listings['ticker'], listings['name']))
+    try:
+        constituents = load_sp500_constituents()
+        names.update(zip(constituents['ticker'], constituents['name']))
+    except Exception:
+        pass
+    return SymbolDirectory(names)
+
+
+def _rebuild_directory():
+    """Build a fresh directory and swap it in, keeping symbols added to the old one"""
+    global _directory, _directory_building
+    try:
+        directory = build_symbol_directory()
+    except Exception:
+        directory = None
+    with _directory_lock:
+        if directory is not None:
+            for ticker, name in _directory.added.items():
+                directory.add(ticker, name)
+            _directory = directory
+        else:
+            _directory.built_at = time.time()
+        _directory_building = False
+
+
+def get_symbol_directory():
+    """The process-wide symbol directory, without waiting on the network
+
+    The first call starts building it in the background and gets an empty
+    directory until that finishes. Once the directory is LISTINGS_TTL old, or
+    LISTINGS_RETRY if it is still empty, it is rebuilt the same way and the
+    old one is served meanwhile.
+    """
+    global _directory, _directory_building
+    with _directory_lock:
+        if _directory is None:
+            _directory = SymbolDirectory()
+            _directory.built_at = 0
+        max_age = LISTINGS_TTL if len(_directory) else LISTINGS_RETRY
+        if not _directory_building and time.time() - _directory.built_at > max_age:
+            _directory_building = True
+            threading.Thread(target=_rebuild_directory, name='mercato-symbols', daemon=True).start()
+        return _directory
+
+
+def is_valid_symbol(ticker):
+    """Whether ticker is tradable: a directory lookup, or Yahoo if it isn't listed
+
+    Symbols Yahoo has prices for are added to the directory, and ones it
+    doesn't are remembered for UNKNOWN_SYMBOL_TTL.
+    """
+    directory = get_symbol_directory()
+    if ticker in directory:
+        return True
+    if _unknown_symbols.get(ticker):
+        return False
+
+    hist = get_fetcher().call(get_provider().history, ticker, period="5d")
+    if hist is None or hist.empty:
+        _unknown_symbols.set(ticker, True)
+        return False
+    directory.add(ticker, ticker)
+    return True
@@ -0,0 +1,74 @@
+"""
+Score history backfill: a second backfill over unchanged data must give
+the same scores and write nothing
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import mercato_data
+import mercato_history
+from mercato_history import _same_rows, backfill_scores
+from mercato_store import FundamentalsStore, PriceStore, ScoreHistoryStore
+
+
+def make_bars(seed, days=300):
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range(end=pd.Timestamp.now().normalize() - pd.Timedelta(days=1), periods=days, tz='America/New_York')
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, days)))
+    return pd.DataFrame({
+        'Open': close * 0.99, 'High': close * 1.01, 'Low': close * 0.98, 'Close': close,
+        'Volume': rng.integers(100_000, 1_000_000, days).astype(float)
+    }, index=index)
+
+
+def make_info(seed):
+    rng = np.random.default_rng(seed + 10_000)
+    return {
+        'longName': f'T{seed} Inc', 'sector': 'Technology',
+        'totalDebt': rng.uniform(0, 1e11), 'totalCash': rng.uniform(0, 1e11),
+        'freeCashflow': rng.uniform(-1e10, 2e10), 'marketCap': rng.uniform(1e10, 1e12),
+        'profitMargins': rng.uniform(-0.1, 0.4), 'operatingMargins': rng.uniform(-0.1, 0.45),
+        'returnOnEquity': rng.uniform(-0.1, 0.4), 'revenueGrowth': rng.uniform(-0.1, 0.3),
+        'earningsGrowth': rng.uniform(-0.1, 0.3), 'beta': rng.uniform(0.5, 2),
+        'fiftyTwoWeekHigh': rng.uniform(100, 150), 'fiftyTwoWeekLow': rng.uniform(50, 100)
+    }
+
+
+@pytest.fixture
+def stores(tmp_path, monkeypatch):
+    prices = PriceStore(str(tmp_path / 'prices.sqlite'))
+    fundamentals = FundamentalsStore(str(tmp_path / 'fundamentals.sqlite'))
+    scores = ScoreHistoryStore(str(tmp_path / 'scores.sqlite'))
+    monkeypatch.setattr(mercato_data, '_price_store', prices)
+    monkeypatch.setattr(mercato_data, '_fundamentals_store', fundamentals)
+    monkeypatch.setattr(mercato_history, '_score_history_store', scores)
+    prices.write(mercato_data.DEFAULT_BENCHMARK, make_bars(999))
+    return prices, fundamentals, scores
+
+
+def test_backfill_twice_is_stable(stores, monkeypatch):
+    prices, fundamentals, scores = stores
+    tickers = [f'T{i:03d}' for i in range(120)]
+    for i, ticker in enumerate(tickers):
+        prices.write(ticker, make_bars(i))
+        fundamentals.write(ticker, make_info(i))
+
+    first = backfill_scores(tickers, offline=True)
+    assert len(first) == len(tickers)
+
+    written = []
+    write = scores.write
+    monkeypatch.setattr(scores, 'write', lambda changed, through=None: written.append(changed) or write(changed, through))
+    second = backfill_scores(tickers, offline=True)
+
+    for ticker in tickers:
+        pd.testing.assert_frame_equal(first[ticker], second[ticker])
+    assert written == [{}]
+
+
+def test_same_rows_counts_nan_as_equal():
+    a = np.array([[1.0, np.nan], [1.0, 2.0], [np.nan, 2.0]])
+    b = np.array([[1.0, np.nan], [1.0, np.nan], [1.0, 2.0]])
+    assert _same_rows(a, b).tolist() == [True, False, False]